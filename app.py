@@ -3,14 +3,18 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 
-from backend.database import init_db
+from backend.database import init_db, check_db, db_pool_stats, DB_BACKEND
 from backend.auth import auth_bp
 from backend.analysis import analysis_bp
 from backend.dashboard import dashboard_bp
+from backend.file_utils import UploadRequest
+from backend.upload_store import ensure_upload_sweeper
+from backend.ocr_pool import OCR_ENGINE
 
 load_dotenv()
 
 app = Flask(__name__, static_folder='frontend', static_url_path='')
+app.request_class = UploadRequest
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_FILE_SIZE', 10485760))
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
@@ -18,6 +22,7 @@ app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 CORS(app, supports_credentials=True)
 
 init_db()
+ensure_upload_sweeper(app.config['UPLOAD_FOLDER'])
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(analysis_bp, url_prefix='/api/analysis')
@@ -31,6 +36,17 @@ def index():
 def profile_page():
     return send_from_directory('frontend', 'profile.html')
 
+@app.route('/api/ready')
+def ready():
+    """Readiness probe: 503 until this worker can reach its database"""
+    database = check_db()
+    return jsonify({
+        'status': 'ready' if database['ok'] else 'unavailable',
+        'database': dict(database, backend=DB_BACKEND),
+        'pool': db_pool_stats(),
+        'ocr_engine': OCR_ENGINE
+    }), 200 if database['ok'] else 503
+
 @app.route('/<path:path>')
 def serve_frontend(path):
     if path.startswith("api/"):
@@ -1,37 +1,68 @@
-import os
-import requests
+import threading
+from concurrent.futures import Future
 
-# -----------------------------
-# Hugging Face Configuration
-# -----------------------------
+from backend.ai_cache import get_cached_explanation, cache_explanation, explanation_key, recent_explanation
+from backend.hf_client import get_hf_client, HF_API_TOKEN
 
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
+# Explanations being generated right now: cache key -> Future. Identical
+# texts that arrive meanwhile wait for that call instead of making their own.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
 
-HF_MODEL_URL = (
-    "https://api-inference.huggingface.co/models/"
-    "mistralai/Mistral-7B-Instruct-v0.2"
-)
 
-HEADERS = {
-    "Authorization": f"Bearer {HF_API_TOKEN}",
-    "Content-Type": "application/json"
-}
+class AIUnavailable(Exception):
+    """No model explanation: no token, a failed call or unusable output"""
 
 
 # -----------------------------
 # Main AI Function
 # -----------------------------
 
-def ai_scam_analysis(text: str, rule_result: dict) -> str:
+def ai_scam_analysis(text: str, rule_result: dict, check_cache: bool = True) -> str:
     """
     Generates a human-style AI explanation focusing on intent,
     desperation, pressure, and manipulation tactics.
+
+    Pass check_cache=False when the caller has already looked the text up
+    (the AI queue does), so a miss isn't counted twice. Raises
+    AIUnavailable when the model gives no explanation; the caller then
+    uses _fallback_explanation().
     """
 
-    # If token missing, fallback immediately
     if not HF_API_TOKEN:
-        return _fallback_explanation(rule_result)
+        raise AIUnavailable("HF_API_TOKEN is not set")
+
+    # Same scam text with the same verdict: reuse the earlier explanation
+    if check_cache:
+        cached = get_cached_explanation(text, rule_result)
+        if cached:
+            return cached
 
+    key = explanation_key(text, rule_result)
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        # A call for the same text may have finished since the caller looked
+        explanation = recent_explanation(text, rule_result) or _generate_explanation(text, rule_result)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(explanation)
+        return explanation
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+def _generate_explanation(text: str, rule_result: dict) -> str:
     prompt = f"""
 You are a cybersecurity expert analyzing job scam messages.
 
@@ -56,37 +87,26 @@ Trust score: {rule_result.get("trust_score")}
 Write a short, clear paragraph.
 """
 
-    try:
-        response = requests.post(
-            HF_MODEL_URL,
-            headers=HEADERS,
-            json={
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": 160,
-                    "temperature": 0.35,
-                    "top_p": 0.9,
-                    "return_full_text": False
-                }
-            },
-            timeout=15
-        )
-
-        if response.status_code == 200:
-            data = response.json()
-
-            # HF text-generation models return a list
-            if isinstance(data, list) and len(data) > 0:
-                generated_text = data[0].get("generated_text", "").strip()
-
-                if len(generated_text) > 40:
-                    return generated_text
-
-    except Exception as e:
-        print("❌ Hugging Face AI error:", e)
-
-    # Safe fallback if anything fails
-    return _fallback_explanation(rule_result)
+    data = get_hf_client().generate({
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": 160,
+            "temperature": 0.35,
+            "top_p": 0.9,
+            "return_full_text": False
+        }
+    })
+
+    # HF text-generation models return a list
+    if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict):
+        generated_text = data[0].get("generated_text", "").strip()
+
+        if len(generated_text) > 40:
+            cache_explanation(text, rule_result, generated_text)
+            return generated_text
+
+    # Failed call, open breaker or too little text
+    raise AIUnavailable("No usable explanation from Hugging Face")
 
 
 # -----------------------------
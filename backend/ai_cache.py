@@ -0,0 +1,135 @@
+"""
+AI Explanation Cache
+Content-addressed cache of generated explanations, keyed on the normalised
+offer text plus the rule verdict, with an in-process LRU/TTL tier and an
+optional MongoDB tier shared by all workers.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 5000))
+AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', 7 * 24 * 3600))
+
+# Share explanations across workers through the ai_explanations collection
+AI_CACHE_SHARED = os.getenv('AI_CACHE_SHARED', 'false').lower() in ('1', 'true', 'yes')
+
+_WHITESPACE = re.compile(r'\s+')
+
+_entries = OrderedDict()    # key -> (expires_at, explanation)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+# -----------------------------
+# KEYS
+# -----------------------------
+
+def normalize_text(text):
+    """Case and whitespace differences don't change the explanation"""
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+
+def explanation_key(text, rule_result):
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{digest}:{rule_result.get('risk_level')}:{rule_result.get('trust_score')}"
+
+
+# -----------------------------
+# LOOKUP / STORE
+# -----------------------------
+
+def _shared_collection():
+    if not AI_CACHE_SHARED:
+        return None
+    from backend.database import get_ai_cache_collection
+    return get_ai_cache_collection()
+
+
+def _remember(key, explanation):
+    with _lock:
+        _entries[key] = (time.monotonic() + AI_CACHE_TTL, explanation)
+        _entries.move_to_end(key)
+        while len(_entries) > AI_CACHE_SIZE:
+            _entries.popitem(last=False)
+            _stats['evictions'] += 1
+
+
+def get_cached_explanation(text, rule_result):
+    """Return a cached explanation or None"""
+    key = explanation_key(text, rule_result)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[1]
+        if entry:
+            del _entries[key]
+
+    collection = _shared_collection()
+    if collection is not None:
+        try:
+            doc = collection.find_one({'_id': key}, {'explanation': 1, 'created_at': 1})
+            fresh_after = datetime.utcnow() - timedelta(seconds=AI_CACHE_TTL)
+            if doc and doc['created_at'] >= fresh_after:
+                _remember(key, doc['explanation'])
+                _count('shared_hits')
+                return doc['explanation']
+        except Exception as e:
+            print("❌ AI cache lookup error:", e)
+
+    _count('misses')
+    return None
+
+
+def recent_explanation(text, rule_result):
+    """In-process lookup that isn't counted, for callers that already counted a miss"""
+    key = explanation_key(text, rule_result)
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+    return None
+
+
+def cache_explanation(text, rule_result, explanation):
+    key = explanation_key(text, rule_result)
+    _remember(key, explanation)
+    _count('stores')
+
+    collection = _shared_collection()
+    if collection is not None:
+        try:
+            collection.replace_one(
+                {'_id': key},
+                {'explanation': explanation, 'created_at': datetime.utcnow()},
+                upsert=True
+            )
+        except Exception as e:
+            print("❌ AI cache store error:", e)
+
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_entries)
+
+    lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,149 @@
+"""
+Background AI Explanations
+In-process worker pool that generates AI explanations after the rule
+result has been returned and writes them onto the stored analysis.
+"""
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from backend.ai_analyzer import ai_scam_analysis, _fallback_explanation, AIUnavailable, HF_API_TOKEN
+from backend.ai_cache import get_cached_explanation
+
+from backend.database import get_analyses_collection, get_unwritten, update_later
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+AI_WORKERS = int(os.getenv('AI_WORKERS', 4))
+
+# Jobs waiting for a worker; when full, the fallback text is used instead
+AI_QUEUE_SIZE = int(os.getenv('AI_QUEUE_SIZE', 200))
+
+AI_PENDING = 'pending'
+AI_DONE = 'done'
+AI_FALLBACK = 'fallback'
+
+_jobs = None
+_workers_pid = None
+_start_lock = threading.Lock()
+
+# Notified whenever a job finishes, so waiters in this process wake early
+_finished = threading.Condition()
+
+
+# -----------------------------
+# WORKERS
+# -----------------------------
+
+def _save_explanation(analysis_id, explanation, status):
+    fields = {
+        'ai_explanation': explanation,
+        'ai_status': status,
+        'ai_completed_at': datetime.utcnow()
+    }
+    # The analysis may still be queued for insertion, or spooled (see insert_later)
+    update_later('analyses', analysis_id, fields)
+    with _finished:
+        _finished.notify_all()
+
+
+def _worker():
+    while True:
+        analysis_id, text, rule_result = _jobs.get()
+        try:
+            try:
+                # enqueue_explanation already looked in the cache
+                explanation = ai_scam_analysis(text=text, rule_result=rule_result, check_cache=False)
+                status = AI_DONE
+            except AIUnavailable:
+                explanation = _fallback_explanation(rule_result)
+                status = AI_FALLBACK
+            except Exception as ai_error:
+                print("❌ AI error:", ai_error)
+                explanation = _fallback_explanation(rule_result)
+                status = AI_FALLBACK
+
+            _save_explanation(analysis_id, explanation, status)
+        except Exception as e:
+            print(f"❌ Failed to store AI explanation for {analysis_id}: {e}")
+        finally:
+            _jobs.task_done()
+
+
+def _ensure_workers():
+    """Start the pool on first use, and again in each forked worker process"""
+    global _jobs, _workers_pid
+
+    with _start_lock:
+        if _jobs is not None and _workers_pid == os.getpid():
+            return
+        _jobs = queue.Queue(maxsize=AI_QUEUE_SIZE)
+        _workers_pid = os.getpid()
+        for i in range(AI_WORKERS):
+            threading.Thread(target=_worker, name=f'ai-worker-{i}', daemon=True).start()
+
+
+def enqueue_explanation(analysis_id, text, rule_result):
+    """
+    Queue an AI explanation for a stored analysis. Returns (status,
+    explanation): done with a cached explanation, pending while queued,
+    or fallback without a Hugging Face token or when the queue is full
+    (the fallback text is then saved straight away).
+    """
+    if HF_API_TOKEN:
+        cached = get_cached_explanation(text, rule_result)
+        if cached:
+            _save_explanation(analysis_id, cached, AI_DONE)
+            return AI_DONE, cached
+
+        _ensure_workers()
+        try:
+            _jobs.put_nowait((analysis_id, text, rule_result))
+            return AI_PENDING, None
+        except queue.Full:
+            pass
+
+    explanation = _fallback_explanation(rule_result)
+    _save_explanation(analysis_id, explanation, AI_FALLBACK)
+    return AI_FALLBACK, explanation
+
+
+def find_explanation(analysis_id, user_id):
+    """
+    The analysis' AI fields, whether it is stored yet or still queued in
+    this process for the same user; None otherwise.
+    """
+    doc = get_analyses_collection().find_one(
+        {'_id': analysis_id, 'user_id': user_id},
+        {'ai_status': 1, 'ai_explanation': 1}
+    )
+    if doc is None:
+        doc = get_unwritten(analysis_id)
+        if doc is not None and doc.get('user_id') != user_id:
+            doc = None
+    return doc
+
+
+def wait_for_explanation(analysis_id, user_id, timeout, poll_interval=1.0):
+    """
+    Poll the stored analysis until its explanation is ready or `timeout`
+    seconds pass. Jobs finishing in this process cut the wait short; jobs
+    run by other processes are picked up on the next poll.
+    """
+    deadline = time.monotonic() + timeout
+
+    while True:
+        doc = find_explanation(analysis_id, user_id)
+        if doc is None or doc.get('ai_status') != AI_PENDING:
+            return doc
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return doc
+        with _finished:
+            _finished.wait(min(poll_interval, remaining))
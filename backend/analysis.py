@@ -1,91 +1,413 @@
-from flask import Blueprint, request, jsonify
-from backend.auth_utils import require_auth
-from backend.database import get_analyses_collection, get_files_collection
-from backend.file_utils import save_uploaded_file, extract_text_from_file, allowed_file
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from backend.auth_utils import require_auth, token_cache_stats
+from backend.database import get_analyses_collection, insert_later, write_behind_stats, db_pool_stats
+from backend.file_utils import (
+    save_uploaded_file, extract_text_from_file, allowed_file, open_upload, UploadRejected
+)
 from backend.scam_detector import analyze_job_offer
-from backend.ai_analyzer import ai_scam_analysis
+from backend.ai_queue import (
+    enqueue_explanation, find_explanation, wait_for_explanation, AI_PENDING, AI_DONE
+)
+from backend.ai_cache import cache_stats
+from backend.site_verifier import get_verifier
+from backend.hf_client import get_hf_client
+from backend.similarity import find_similar_offers, index_analysis
+from backend.result_cache import (
+    text_fingerprint, file_fingerprint, get_cached_result, cache_result, result_cache_stats
+)
+from backend.rules import get_rules
+from backend.extraction_cache import extraction_cache_stats
+from backend.ocr_pool import get_ocr_pool, OCRBusy, OCRTimeout, OCR_QUEUE_WAIT
+from backend.password_hasher import get_password_hasher
+from backend.user_stats import record_analysis, record_analyses
+from backend.upload_store import (
+    check_upload_quota, ensure_upload_sweeper, release_blob, upload_store_stats, QuotaExceeded
+)
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from bson import ObjectId
+import json
+import os
 
 analysis_bp = Blueprint('analysis', __name__)
 
+# Offers analysed (and saved with one insert_many) per batch chunk
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 500))
+
+# Shared by all batch requests; threads mostly overlap DNS lookups
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 8))
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+
+def _analysis_record(user_id, text, analysis_result, ai_explanation):
+    return {
+        'user_id': user_id,
+        'text': text[:1000],
+        'risk_level': analysis_result['risk_level'],
+        'trust_score': analysis_result['trust_score'],
+        'explanations': analysis_result['explanations'],
+        'ai_explanation': ai_explanation,
+        'rule_pack_version': analysis_result['rule_pack_version'],
+        'created_at': datetime.utcnow()
+    }
+
 @analysis_bp.route('/analyze', methods=['POST'])
 @require_auth
 def analyze():
+    # Blob reference taken for the upload; it belongs to the upload record
+    # once that is queued, and is given back on any earlier failure
+    claimed_blob = None
     try:
         user_id = request.user_id
         text = None
         company_email = None
         company_website = None
         file_info = None
+        fingerprint = None
+        cached = None
+        extraction = {}
+        rules_version = get_rules().version
+        analysis_id = ObjectId()
 
         # ---------- FILE ----------
+        if request.mimetype == 'multipart/form-data':
+            # Before the body is parsed (and the upload written)
+            check_upload_quota(user_id, request.content_length)
+
         if 'file' in request.files:
             file = request.files['file']
             if file.filename and allowed_file(file.filename):
-                file_path, filename = save_uploaded_file(file, user_id)
+                # Hashed and type-checked while the body streamed in
+                ensure_upload_sweeper(current_app.config['UPLOAD_FOLDER'])
+                file_path, filename, content_hash, size = save_uploaded_file(file, user_id)
+                claimed_blob = content_hash
                 file_extension = filename.rsplit('.', 1)[1].lower()
-                text = extract_text_from_file(file_path, file_extension)
 
-                files_collection = get_files_collection()
+                # Same file seen before: skip extraction and analysis
+                fingerprint = file_fingerprint(content_hash)
+                cached = get_cached_result(fingerprint, rules_version)
+                if cached:
+                    text = cached['text']
+                else:
+                    with open_upload(file_path) as buffer:
+                        text = extract_text_from_file(
+                            file_path, file_extension, stats=extraction,
+                            content_hash=content_hash, buffer=buffer
+                        )
+
                 file_info = {
                     'user_id': user_id,
                     'filename': filename,
                     'file_path': file_path,
                     'file_type': file_extension,
+                    'content_hash': content_hash,
+                    'size': size,
+                    'analysis_id': analysis_id,
+                    'extraction': extraction,
                     'uploaded_at': datetime.utcnow()
                 }
-                files_collection.insert_one(file_info)
 
         # ---------- TEXT ----------
         if not text:
             data = request.get_json() if request.is_json else request.form
-            text = data.get('text', '')
-            company_email = data.get('company_email', '')
-            company_website = data.get('company_website', '')
+            text = data.get('text') or ''
+            company_email = data.get('company_email') or ''
+            company_website = data.get('company_website') or ''
+            # Keyed on the pasted text, not on an upload that had none
+            fingerprint = None
 
-        if not text or len(text.strip()) < 10:
+        if not isinstance(text, str) or len(text.strip()) < 10:
             return jsonify({'error': 'Text too short'}), 400
 
+        # Pasted text is looked up once it is known to be valid
+        if fingerprint is None:
+            fingerprint = text_fingerprint(text, company_email, company_website)
+            cached = get_cached_result(fingerprint, rules_version)
+
         # ---------- RULE ANALYSIS ----------
-        analysis_result = analyze_job_offer(
-            text=text,
-            company_email=company_email or None,
-            company_website=company_website or None
-        )
+        if cached:
+            analysis_result = cached['result']
+            # Offers indexed since the entry was cached; the DNS check is reused
+            analysis_result['similar_offers'] = find_similar_offers(text)
+        else:
+            analysis_result = analyze_job_offer(
+                text=text,
+                company_email=company_email or None,
+                company_website=company_website or None
+            )
+            # A partial extraction is analysed, but the file is read again next time
+            if not extraction.get('partial'):
+                cache_result(fingerprint, analysis_result['rule_pack_version'], text, analysis_result)
+        analysis_result['cached'] = bool(cached)
+
+        # ---------- SAVE ----------
+        # Written behind the response; the id was assigned up front
+        record = _analysis_record(user_id, text, analysis_result, None)
+        record['_id'] = analysis_id
+        record['ai_status'] = AI_PENDING
+        insert_later('analyses', record)
+        if file_info:
+            insert_later('uploaded_files', file_info)
+            claimed_blob = None
+        record_analysis(user_id, record)
+        if not cached:
+            index_analysis(analysis_id, text, analysis_result)
 
         # -----------------------------
         # AI ANALYSIS (HUGGING FACE)
         # -----------------------------
-        try:
-            ai_explanation = ai_scam_analysis(
-                text=text,
-                rule_result=analysis_result
-            )
-        except Exception as ai_error:
-            print("❌ AI error:", ai_error)
-            ai_explanation = "AI explanation unavailable. Please rely on rule-based analysis."
+        # Generated in the background; poll /<id>/ai or stream /<id>/ai/stream
+        ai_status, ai_explanation = enqueue_explanation(analysis_id, text, analysis_result)
 
         analysis_result["ai_explanation"] = ai_explanation
+        analysis_result["ai_status"] = ai_status
         analysis_result["ai_enabled"] = True
-
-        # ---------- SAVE ----------
-        analyses = get_analyses_collection()
-        record = {
-            'user_id': user_id,
-            'text': text[:1000],
-            'risk_level': analysis_result['risk_level'],
-            'trust_score': analysis_result['trust_score'],
-            'explanations': analysis_result['explanations'],
-            'ai_explanation': ai_explanation,
-            'created_at': datetime.utcnow()
-        }
-        result = analyses.insert_one(record)
-
-        analysis_result['analysis_id'] = str(result.inserted_id)
+        analysis_result['analysis_id'] = str(analysis_id)
         analysis_result['created_at'] = record['created_at'].isoformat()
 
         return jsonify({'result': analysis_result}), 200
 
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), 400
+
+    except QuotaExceeded as e:
+        return jsonify({'error': str(e)}), 403
+
+    except (OCRBusy, OCRTimeout):
+        response = jsonify({'error': 'Too many files are being scanned right now, please retry shortly'})
+        response.headers['Retry-After'] = str(int(OCR_QUEUE_WAIT) or 1)
+        return response, 503
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    finally:
+        if claimed_blob:
+            try:
+                release_blob(claimed_blob)
+            except Exception as e:
+                print(f"❌ Failed to release upload blob {claimed_blob}: {e}")
+
+
+# -----------------------------
+# AI EXPLANATION STATUS
+# -----------------------------
+
+# Longest a single SSE connection is held open
+AI_STREAM_TIMEOUT = float(os.getenv('AI_STREAM_TIMEOUT', 60))
+
+
+def _ai_payload(doc):
+    return {
+        'ai_status': doc.get('ai_status', AI_DONE),
+        'ai_explanation': doc.get('ai_explanation')
+    }
+
+
+@analysis_bp.route('/<analysis_id>/ai', methods=['GET'])
+@require_auth
+def get_ai_explanation(analysis_id):
+    """Poll for the background AI explanation of an analysis"""
+    try:
+        doc = find_explanation(ObjectId(analysis_id), request.user_id)
+        if not doc:
+            return jsonify({'error': 'Analysis not found'}), 404
+
+        return jsonify(_ai_payload(doc)), 200
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@analysis_bp.route('/<analysis_id>/ai/stream', methods=['GET'])
+@require_auth
+def stream_ai_explanation(analysis_id):
+    """Server-sent event delivered once the AI explanation is ready"""
+    try:
+        oid = ObjectId(analysis_id)
+    except Exception:
+        return jsonify({'error': 'Invalid analysis id'}), 400
+    user_id = request.user_id
+
+    def generate():
+        doc = wait_for_explanation(oid, user_id, AI_STREAM_TIMEOUT)
+        if doc is None:
+            yield 'event: error\ndata: {"error": "Analysis not found"}\n\n'
+            return
+        yield f"event: ai\ndata: {json.dumps(_ai_payload(doc))}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# -----------------------------
+# METRICS
+# -----------------------------
+
+@analysis_bp.route('/metrics', methods=['GET'])
+@require_auth
+def analysis_metrics():
+    """Cache and upstream client counters for this worker process"""
+    return jsonify({
+        'ai_cache': cache_stats(),
+        'result_cache': result_cache_stats(),
+        'extraction_cache': extraction_cache_stats(),
+        'ocr_pool': get_ocr_pool().snapshot(),
+        'upload_store': upload_store_stats(),
+        'write_behind': write_behind_stats(),
+        'db_pool': db_pool_stats(),
+        'token_cache': token_cache_stats(),
+        'password_hasher': get_password_hasher().snapshot(),
+        'dns_cache': dict(get_verifier().stats),
+        'hf_client': get_hf_client().snapshot()
+    }), 200
+
+
+# -----------------------------
+# BATCH ANALYSIS
+# -----------------------------
+
+class _InvalidLine:
+    """An NDJSON line that isn't JSON; reported as that offer's error"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _read_batch_offers():
+    """
+    Yields offers from a JSON array (or {"offers": [...]}) body, or one
+    per line from an NDJSON body without buffering the whole upload.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield _InvalidLine(f'Invalid JSON: {e}')
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('offers')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of offers or an NDJSON body')
+    yield from data
+
+
+def _analyze_batch_offer(offer):
+    if isinstance(offer, _InvalidLine):
+        raise ValueError(offer.error)
+    if isinstance(offer, str):
+        offer = {'text': offer}
+    text = offer.get('text') or ''
+    if len(text.strip()) < 10:
+        raise ValueError('Text too short')
+
+    result = analyze_job_offer(
+        text=text,
+        company_email=offer.get('company_email') or None,
+        company_website=offer.get('company_website') or None
+    )
+    return text, result
+
+
+def _run_batch_chunk(user_id, batch_id, chunk):
+    """Analyse one chunk, yielding result lines as offers finish, then save it"""
+    futures = {
+        _batch_executor.submit(_analyze_batch_offer, offer): (index, offer)
+        for index, offer in chunk
+    }
+    records = []
+    texts = []
+
+    for future in as_completed(futures):
+        index, offer = futures[future]
+        line = {'index': index}
+        if isinstance(offer, dict) and 'ref' in offer:
+            line['ref'] = offer['ref']
+
+        try:
+            text, result = future.result()
+        except Exception as e:
+            line['error'] = str(e)
+        else:
+            # Id is assigned here so it can be streamed before the insert
+            record = _analysis_record(user_id, text, result, None)
+            record['_id'] = ObjectId()
+            record['batch_id'] = batch_id
+            records.append(record)
+            texts.append(text)
+
+            result['analysis_id'] = str(record['_id'])
+            result['created_at'] = record['created_at'].isoformat()
+            line['result'] = result
+
+        yield line
+
+    if records:
+        try:
+            get_analyses_collection().insert_many(records, ordered=False)
+        except Exception as e:
+            yield {
+                'error': f'Failed to save results: {e}',
+                'analysis_ids': [str(r['_id']) for r in records]
+            }
+            return
+
+        record_analyses(user_id, records)
+        for record, text in zip(records, texts):
+            index_analysis(record['_id'], text, record)
+
+
+@analysis_bp.route('/batch', methods=['POST'])
+@require_auth
+def analyze_batch():
+    """
+    Rule-based analysis of many offers in one request.
+    Results stream back as NDJSON in completion order, each tagged with
+    the offer's input index; a final line summarises the batch.
+    """
+    user_id = request.user_id
+    batch_id = str(ObjectId())
+
+    def generate():
+        processed = 0
+        failed = 0
+        chunk = []
+
+        def flush():
+            nonlocal processed, failed
+            for line in _run_batch_chunk(user_id, batch_id, chunk):
+                if 'index' in line:
+                    processed += 1
+                    failed += 'error' in line
+                yield json.dumps(line) + '\n'
+            chunk.clear()
+
+        try:
+            for index, offer in enumerate(_read_batch_offers()):
+                chunk.append((index, offer))
+                if len(chunk) >= BATCH_CHUNK_SIZE:
+                    yield from flush()
+            if chunk:
+                yield from flush()
+        except ValueError as e:
+            # Offers read before the bad input are still analysed and saved
+            if chunk:
+                yield from flush()
+            yield json.dumps({'error': f'Invalid batch input: {e}'}) + '\n'
+
+        yield json.dumps({
+            'done': True,
+            'batch_id': batch_id,
+            'processed': processed,
+            'failed': failed
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -3,16 +3,65 @@ Authentication Blueprint
 Handles user signup, login, session management, and profile updates.
 """
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from backend.database import get_users_collection
 from backend.auth_utils import generate_token, require_auth
+from backend.password_hasher import get_password_hasher, needs_rehash, HashingBusy
 from datetime import datetime
 from bson import ObjectId
+import os
 import re
+import threading
+import time
 
 # Prefix is handled globally in app.py
 auth_bp = Blueprint('auth', __name__)
 
+# What profile reads need; the password hash is never loaded for them
+PROFILE_FIELDS = {'username': 1, 'email': 1}
+
+# Seconds a profile is served from memory (0 disables the cache). Edits
+# clear this worker's copy; other workers catch up within the TTL.
+PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', 30))
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+
+_profiles = {}      # user_id -> (expires_at, profile)
+_profiles_lock = threading.Lock()
+
+
+def _get_profile(user_id):
+    """{'username', 'email'} for the user, or None if there is no such user"""
+    now = time.monotonic()
+    with _profiles_lock:
+        entry = _profiles.get(user_id)
+        if entry is not None and entry[0] > now:
+            return dict(entry[1])
+
+    user = get_users_collection().find_one({'_id': ObjectId(user_id)}, PROFILE_FIELDS)
+    if not user:
+        return None
+
+    profile = {'username': user.get('username'), 'email': user.get('email')}
+    if PROFILE_CACHE_TTL > 0:
+        with _profiles_lock:
+            if len(_profiles) >= PROFILE_CACHE_SIZE:
+                # Drop expired entries, or everything if none have expired
+                expired = [k for k, (expires_at, _) in _profiles.items() if expires_at <= now]
+                for key in expired or list(_profiles):
+                    del _profiles[key]
+            _profiles[user_id] = (now + PROFILE_CACHE_TTL, profile)
+    return dict(profile)
+
+
+def _forget_profile(user_id):
+    with _profiles_lock:
+        _profiles.pop(user_id, None)
+
+
+def _hashing_busy():
+    response = jsonify({'error': 'Too many sign-in attempts right now, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
 # =========================
 # SIGNUP
 # =========================
@@ -35,13 +84,13 @@ def signup():
             return jsonify({'error': 'Password must be at least 6 characters'}), 400
 
         users_collection = get_users_collection()
-        if users_collection.find_one({'email': email}):
+        if users_collection.find_one({'email': email}, {'_id': 1}):
             return jsonify({'error': 'Email already registered'}), 409
 
         user_data = {
             'username': username,
             'email': email,
-            'password': generate_password_hash(password),
+            'password': get_password_hasher().hash(password),
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
@@ -54,6 +103,8 @@ def signup():
             'token': token,
             'user': {'id': str(result.inserted_id), 'username': username, 'email': email}
         }), 201
+    except HashingBusy:
+        return _hashing_busy()
     except Exception as e:
         return jsonify({'error': f'Signup failed: {str(e)}'}), 500
 
@@ -68,11 +119,19 @@ def login():
         password = data.get('password', '').strip()
 
         users_collection = get_users_collection()
-        user = users_collection.find_one({'email': email})
+        user = users_collection.find_one({'email': email}, {'password': 1, 'username': 1})
 
-        if not user or not check_password_hash(user['password'], password):
+        hasher = get_password_hasher()
+        if not user or not hasher.check(user['password'], password):
             return jsonify({'error': 'Invalid email or password'}), 401
 
+        # Hashed with older settings: upgrade it now that we know the password
+        if needs_rehash(user['password']):
+            hasher.rehash_later(password, lambda new_hash: users_collection.update_one(
+                {'_id': user['_id'], 'password': user['password']},
+                {'$set': {'password': new_hash}}
+            ))
+
         token = generate_token(str(user['_id']), email)
         return jsonify({
             'message': 'Login successful',
@@ -83,6 +142,8 @@ def login():
                 'email': email
             }
         }), 200
+    except HashingBusy:
+        return _hashing_busy()
     except Exception as e:
         return jsonify({'error': f'Login failed: {str(e)}'}), 500
 
@@ -93,15 +154,11 @@ def login():
 @require_auth
 def get_profile():
     try:
-        users_collection = get_users_collection()
-        user = users_collection.find_one({'_id': ObjectId(request.user_id)})
-        if not user:
+        profile = _get_profile(request.user_id)
+        if not profile:
             return jsonify({'error': 'User not found'}), 404
             
-        return jsonify({
-            'username': user.get('username'),
-            'email': user.get('email')
-        }), 200
+        return jsonify(profile), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -124,6 +181,7 @@ def update_profile():
             {'_id': ObjectId(request.user_id)}, 
             {'$set': updated_fields}
         )
+        _forget_profile(request.user_id)
         return jsonify({'message': 'Profile updated successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -134,9 +192,10 @@ def change_password():
     try:
         data = request.get_json()
         users_collection = get_users_collection()
-        user = users_collection.find_one({'_id': ObjectId(request.user_id)})
+        user = users_collection.find_one({'_id': ObjectId(request.user_id)}, {'password': 1})
 
-        if not check_password_hash(user['password'], data.get('old_password')):
+        hasher = get_password_hasher()
+        if not hasher.check(user['password'], data.get('old_password') or ''):
             return jsonify({'error': 'Incorrect current password'}), 401
 
         new_pass = data.get('new_password')
@@ -146,11 +205,14 @@ def change_password():
         get_users_collection().update_one(
             {'_id': ObjectId(request.user_id)}, 
             {'$set': {
-                'password': generate_password_hash(new_pass), 
+                'password': hasher.hash(new_pass),
                 'updated_at': datetime.utcnow()
             }}
         )
+        _forget_profile(request.user_id)
         return jsonify({'message': 'Password changed successfully'}), 200
+    except HashingBusy:
+        return _hashing_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -161,17 +223,13 @@ def change_password():
 @require_auth
 def me():
     try:
-        users_collection = get_users_collection()
-        user = users_collection.find_one({'_id': ObjectId(request.user_id)})
+        profile = _get_profile(request.user_id)
 
-        if not user:
+        if not profile:
             return jsonify({'error': 'User not found'}), 404
 
         # Consistent with dashboard.js requirement
-        return jsonify({
-            'username': user.get('username'), 
-            'email': user.get('email')
-        }), 200
+        return jsonify(profile), 200
     except Exception as e:
         return jsonify({'error': f'Failed to load user: {str(e)}'}), 500
 
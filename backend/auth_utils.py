@@ -4,7 +4,11 @@ JWT token generation and verification
 """
 import jwt
 from datetime import datetime, timedelta
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from functools import wraps
 from flask import request, jsonify
@@ -14,6 +18,14 @@ load_dotenv()
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 TOKEN_EXPIRY_HOURS = 24
 
+# Verified tokens remembered per process (0 disables the cache); an entry
+# never outlives the token's own expiry
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+_verified = OrderedDict()   # sha256(token) -> (exp, payload)
+_verified_lock = threading.Lock()
+_token_stats = {'hits': 0, 'misses': 0}
+
 def generate_token(user_id, email):
     """Generate JWT token for user"""
     payload = {
@@ -24,16 +36,47 @@ def generate_token(user_id, email):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 
+def _cached_payload(digest):
+    with _verified_lock:
+        entry = _verified.get(digest)
+        if entry is not None:
+            if entry[0] > time.time():
+                _verified.move_to_end(digest)
+                _token_stats['hits'] += 1
+                return dict(entry[1])
+            del _verified[digest]
+        _token_stats['misses'] += 1
+    return None
+
+
 def verify_token(token):
     """Verify JWT token and return payload"""
+    digest = hashlib.sha256(token.encode('utf-8')).digest() if TOKEN_CACHE_SIZE else None
+    if digest is not None:
+        payload = _cached_payload(digest)
+        if payload is not None:
+            return payload
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+    # Only verified tokens are cached, so a forged one is decoded every time
+    if digest is not None and 'exp' in payload:
+        with _verified_lock:
+            _verified[digest] = (payload['exp'], payload)
+            while len(_verified) > TOKEN_CACHE_SIZE:
+                _verified.popitem(last=False)
+    return dict(payload)
+
+
+def token_cache_stats():
+    with _verified_lock:
+        return dict(_token_stats, size=len(_verified))
+
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
@@ -4,33 +4,84 @@ Handles user dashboard and analysis history
 """
 from flask import Blueprint, request, jsonify
 from backend.auth_utils import require_auth
-from backend.database import get_analyses_collection
+from backend.database import get_analyses_collection, wait_written
+from backend.upload_store import release_upload
+from backend.user_stats import get_user_stats, remove_analysis
 from datetime import datetime
 from bson import ObjectId
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Fields the history list shows; the stored text and AI explanation stay out
+LIST_FIELDS = {
+    'risk_level': 1,
+    'trust_score': 1,
+    'explanations': 1,
+    'ai_status': 1,
+    'rule_pack_version': 1,
+    'batch_id': 1,
+    'file_info': 1,
+    'created_at': 1
+}
+
+MAX_PAGE_SIZE = 100
+
+
+def _page_cursor(analysis):
+    """Opaque position after `analysis` in the newest-first list"""
+    return f"{analysis['created_at'].isoformat()}_{analysis['_id']}"
+
+
+def _after_cursor(cursor):
+    """Query matching analyses older than the cursor (created_at, then _id)"""
+    try:
+        created_at, analysis_id = cursor.rsplit('_', 1)
+        created_at = datetime.fromisoformat(created_at)
+        analysis_id = ObjectId(analysis_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    return {'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': analysis_id}}
+    ]}
+
+
 @dashboard_bp.route('/analyses', methods=['GET'])
 @require_auth
 def get_analyses():
-    """Get all analyses for the current user"""
+    """
+    Get the current user's analyses, newest first. Pass `next_cursor` from
+    the previous page as `cursor` to continue; each page is an index range
+    scan on (user_id, created_at, _id) however deep it is. `skip` is still
+    accepted for old clients.
+    """
     try:
         user_id = request.user_id
         
         # Get query parameters
-        limit = int(request.args.get('limit', 50))
+        limit = max(1, min(int(request.args.get('limit', 50)), MAX_PAGE_SIZE))
         skip = int(request.args.get('skip', 0))
-        
-        analyses_collection = get_analyses_collection()
-        
-        # Get analyses sorted by created_at descending
-        cursor = analyses_collection.find({'user_id': user_id}) \
-            .sort('created_at', -1) \
+        page_cursor = request.args.get('cursor')
+
+        query = {'user_id': user_id}
+        if page_cursor:
+            try:
+                query.update(_after_cursor(page_cursor))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            skip = 0
+
+        # One extra row tells whether another page follows
+        cursor = get_analyses_collection().find(query, LIST_FIELDS) \
+            .sort([('created_at', -1), ('_id', -1)]) \
             .skip(skip) \
-            .limit(limit)
-        
+            .limit(limit + 1)
+        rows = list(cursor)
+        next_cursor = _page_cursor(rows[limit - 1]) if len(rows) > limit else None
+
         analyses = []
-        for analysis in cursor:
+        for analysis in rows[:limit]:
             analysis['_id'] = str(analysis['_id'])
             if 'created_at' in analysis:
                 analysis['created_at'] = analysis['created_at'].isoformat()
@@ -38,14 +89,15 @@ def get_analyses():
                 analysis['file_info']['_id'] = str(analysis['file_info']['_id'])
             analyses.append(analysis)
         
-        # Get total count
-        total_count = analyses_collection.count_documents({'user_id': user_id})
+        # Total from the user's counters instead of counting every document
+        total_count = get_user_stats(user_id).get('total', 0)
         
         return jsonify({
             'analyses': analyses,
             'total': total_count,
             'limit': limit,
-            'skip': skip
+            'skip': skip,
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -58,15 +110,23 @@ def delete_analysis(analysis_id):
     try:
         user_id = request.user_id
         analyses_collection = get_analyses_collection()
+
+        # A just-created analysis may still be queued for insertion
+        wait_written(ObjectId(analysis_id))
         
         # Verify ownership and delete
-        result = analyses_collection.delete_one({
-            '_id': ObjectId(analysis_id),
-            'user_id': user_id
-        })
+        deleted = analyses_collection.find_one_and_delete(
+            {'_id': ObjectId(analysis_id), 'user_id': user_id},
+            projection={'risk_level': 1, 'trust_score': 1}
+        )
         
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({'error': 'Analysis not found or unauthorized'}), 404
+
+        remove_analysis(user_id, deleted)
+
+        # Frees the user's quota; the file goes once no one references it
+        release_upload(ObjectId(analysis_id), user_id)
         
         return jsonify({
             'message': 'Analysis deleted successfully'
@@ -81,19 +141,19 @@ def get_stats():
     """Get user statistics"""
     try:
         user_id = request.user_id
-        analyses_collection = get_analyses_collection()
-        
-        # Get all analyses for user
-        analyses = list(analyses_collection.find({'user_id': user_id}))
-        
-        total_analyses = len(analyses)
-        safe_count = sum(1 for a in analyses if a.get('risk_level') == 'Safe')
-        suspicious_count = sum(1 for a in analyses if a.get('risk_level') == 'Suspicious')
-        high_risk_count = sum(1 for a in analyses if a.get('risk_level') == 'High Risk')
-        
+
+        # Maintained by analyze/delete; no scan of the user's analyses
+        stats = get_user_stats(user_id)
+        counts = stats.get('counts', {})
+
+        total_analyses = stats.get('total', 0)
+        safe_count = counts.get('Safe', 0)
+        suspicious_count = counts.get('Suspicious', 0)
+        high_risk_count = counts.get('High Risk', 0)
+
         avg_trust_score = 0
         if total_analyses > 0:
-            avg_trust_score = sum(a.get('trust_score', 0) for a in analyses) / total_analyses
+            avg_trust_score = stats.get('trust_sum', 0) / total_analyses
         
         return jsonify({
             'total_analyses': total_analyses,
@@ -110,14 +170,10 @@ def get_stats():
 def dashboard_summary():
     try:
         user_id = request.user_id
-        analyses_collection = get_analyses_collection()
+        stats = get_user_stats(user_id)
+        counts = stats.get('counts', {})
 
-        analyses = list(
-            analyses_collection.find({'user_id': user_id})
-            .sort('created_at', -1)
-        )
-
-        total = len(analyses)
+        total = stats.get('total', 0)
 
         if total == 0:
             return jsonify({
@@ -128,10 +184,8 @@ def dashboard_summary():
                 'recent': []
             }), 200
 
-        avg_score = sum(a.get('trust_score', 0) for a in analyses) / total
-        high_risk = sum(
-            1 for a in analyses if a.get('risk_level') in ['High', 'High Risk']
-        )
+        avg_score = stats.get('trust_sum', 0) / total
+        high_risk = counts.get('High', 0) + counts.get('High Risk', 0)
 
         return jsonify({
             'overall_score': round(avg_score),
@@ -145,7 +199,7 @@ def dashboard_summary():
                     'explanations': a.get('explanations', [])[:3],
                     'created_at': a.get('created_at').isoformat()
                 }
-                for a in analyses[:5]
+                for a in stats.get('recent', [])
             ]
         }), 200
 
@@ -1,52 +1,638 @@
 """
 Database Configuration and Models
 """
-from pymongo import MongoClient
+from pymongo import MongoClient, WriteConcern, monitoring, timeout as mongo_timeout
+from pymongo.errors import BulkWriteError, PyMongoError
+from bson import ObjectId, json_util
 from datetime import datetime
+import atexit
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# "mongodb", or "sqlite" for the embedded single-file store
+# (backend/embedded_store.py) on single-node setups and in CI
+DB_BACKEND = os.getenv("DB_BACKEND", "mongodb").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join("data", "app.db"))
+
+# -----------------------------
+# CONNECTION POOL
+# -----------------------------
+
+# Connections per worker process; size it so workers x pool stays under
+# the server's connection limit
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", 60000))
+
+# Longest an operation waits for a free pooled connection
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+
+# Wire compression, e.g. "zstd,snappy,zlib" (zstd and snappy need their
+# Python packages); empty disables it
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+# Longest the readiness check may take
+DB_READY_TIMEOUT = float(os.getenv("DB_READY_TIMEOUT", 2))
+
 client = None
 db = None
+_client_pid = None
+_client_lock = threading.Lock()
+_pool_metrics = None
 
-def init_db():
-    """Initialize MongoDB connection"""
-    global client, db
 
-    mongodb_uri = os.getenv("MONGODB_URI")
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters, including how long operations wait for a connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"checkouts": 0, "checkout_failures": 0, "wait_timeouts": 0,
+                      "waiting": 0, "max_waiting": 0, "in_use": 0, "open": 0,
+                      "created": 0, "closed": 0, "pool_cleared": 0,
+                      "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _waited(self):
+        started = getattr(self._local, "started", None)
+        return (time.perf_counter() - started) * 1000 if started else 0.0
+
+    def connection_check_out_started(self, event):
+        # Check-out events fire on the thread doing the check-out
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.stats["waiting"] += 1
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self.stats["waiting"])
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.stats["waiting"] -= 1
+            self.stats["checkouts"] += 1
+            self.stats["in_use"] += 1
+            self.stats["wait_ms_total"] += waited
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], waited)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.stats["waiting"] -= 1
+            self.stats["checkout_failures"] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.stats["wait_timeouts"] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.stats["in_use"] -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.stats["created"] += 1
+            self.stats["open"] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.stats["closed"] += 1
+            self.stats["open"] -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.stats["pool_cleared"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 3)
+        stats["wait_ms_max"] = round(stats["wait_ms_max"], 3)
+        stats["max_pool_size"] = MONGO_MAX_POOL_SIZE
+        return stats
+
+
+def _client_options():
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+
+def _connect():
+    """A client for this process; MongoClient must not be shared across fork"""
+    global client, db, _client_pid, _pool_metrics
+
+    if DB_BACKEND == "sqlite":
+        from backend.embedded_store import EmbeddedDatabase
+        client, _pool_metrics = None, None
+        db = EmbeddedDatabase(SQLITE_PATH)
+        _client_pid = os.getpid()
+        return
+
+    _pool_metrics = PoolMetrics()
+    # connect=False: no background connections until first use, so a
+    # client built before a fork (e.g. gunicorn --preload) is never used
+    client = MongoClient(os.getenv("MONGODB_URI"), connect=False,
+                         event_listeners=[_pool_metrics], **_client_options())
+    db = client[os.getenv("DATABASE_NAME", "job_scam_detector")]
+    _client_pid = os.getpid()
+
+
+def init_db():
+    """Initialize MongoDB connection (or open the embedded database)"""
     database_name = os.getenv("DATABASE_NAME", "job_scam_detector")
 
     try:
-        client = MongoClient(mongodb_uri)
-        db = client[database_name]
+        with _client_lock:
+            _connect()
 
         # Test connection
-        client.admin.command("ping")
-        print(f"✓ Connected to MongoDB: {database_name}")
+        db.command("ping")
+        if DB_BACKEND == "sqlite":
+            print(f"✓ Using embedded SQLite database: {SQLITE_PATH}")
+        else:
+            print(f"✓ Connected to MongoDB: {database_name}")
 
         # Indexes
         db.users.create_index("email", unique=True)
         db.analyses.create_index("created_at")
+        # Dashboard lists and stats: one user's analyses, newest first
+        db.analyses.create_index([("user_id", 1), ("created_at", -1), ("_id", -1)])
         db.offers.create_index("risk_level")
+        db.ai_explanations.create_index(
+            "created_at",
+            expireAfterSeconds=int(float(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600)))
+        )
+        db.uploaded_files.create_index("user_id")
+        db.uploaded_files.create_index("uploaded_at")
+        db.uploaded_files.create_index("analysis_id")
+        db.upload_blobs.create_index([("refs", 1), ("orphaned_at", 1)])
+        db.result_cache.create_index(
+            "created_at",
+            expireAfterSeconds=int(float(os.getenv("RESULT_CACHE_MAX_AGE", 24 * 3600)))
+        )
 
     except Exception as e:
-        print(f"✗ MongoDB connection error: {e}")
+        print(f"✗ Database connection error: {e}")
         raise
 
 
 def get_db():
+    """This process's database; a forked worker opens its own client on first use"""
+    if _client_pid is not None and _client_pid != os.getpid():
+        with _client_lock:
+            if _client_pid != os.getpid():
+                _connect()
     return db
 
 def get_users_collection():
-    return db.users
+    return get_db().users
 
 def get_analyses_collection():
-    return db.analyses
+    return get_db().analyses
 
 def get_offers_collection():
-    return db.offers
+    return get_db().offers
 
 def get_files_collection():
-    return db.uploaded_files
+    return get_db().uploaded_files
+
+def get_blobs_collection():
+    return get_db().upload_blobs
+
+def get_user_stats_collection():
+    return get_db().user_stats
+
+def get_ai_cache_collection():
+    return get_db().ai_explanations
+
+def get_result_cache_collection():
+    return get_db().result_cache
+
+
+def db_pool_stats():
+    """Connection pool counters for this process's client"""
+    get_db()
+    return _pool_metrics.snapshot() if _pool_metrics is not None else None
+
+
+def check_db(timeout=DB_READY_TIMEOUT):
+    """Ping the server within `timeout` seconds: {'ok', 'latency_ms' or 'error'}"""
+    started = time.perf_counter()
+    try:
+        with mongo_timeout(timeout):
+            get_db().command("ping")
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+# -----------------------------
+# WRITE-BEHIND INSERTS
+# -----------------------------
+# Records the request doesn't need to read back (analyses, upload records)
+# are queued here and written by one thread per process in batched,
+# unordered insert_many calls. Ids are assigned before queueing, so callers
+# can return them straight away. Batches the database rejects or doesn't
+# take in time go to a local spool file and are replayed later; replays are
+# safe to repeat because the ids are fixed.
+
+PERSIST_ASYNC = os.getenv("PERSIST_ASYNC", "true").lower() == "true"
+
+# Most records per insert_many, and how long the writer waits to fill one
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", 500))
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", 0.05))
+
+# Records waiting for the writer; beyond this they are spooled directly
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", 10000))
+
+# Write concern for these inserts: w (a number or "majority"), journal, and
+# how long the server may take to satisfy it before the batch is spooled
+PERSIST_W = os.getenv("PERSIST_W", "1")
+PERSIST_JOURNAL = os.getenv("PERSIST_JOURNAL", "false").lower() == "true"
+PERSIST_WTIMEOUT_MS = int(os.getenv("PERSIST_WTIMEOUT_MS", 5000))
+
+PERSIST_SPOOL_DIR = os.getenv("PERSIST_SPOOL_DIR", os.path.join("data", "write_spool"))
+
+# Seconds the writer must be idle before it replays spooled records
+PERSIST_REPLAY_INTERVAL = float(os.getenv("PERSIST_REPLAY_INTERVAL", 5))
+
+# How long exit waits for queued records before spooling the rest
+PERSIST_SHUTDOWN_WAIT = float(os.getenv("PERSIST_SHUTDOWN_WAIT", 5))
+
+_DUPLICATE_KEY = 11000
+
+
+def _write_concern():
+    w = int(PERSIST_W) if PERSIST_W.isdigit() else PERSIST_W
+    return WriteConcern(w=w, j=PERSIST_JOURNAL or None, wtimeout=PERSIST_WTIMEOUT_MS or None)
+
+
+def _pid_alive(pid):
+    if os.name != "posix":
+        return False    # only this process's own spool is replayed
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WriteBehind:
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=PERSIST_QUEUE_SIZE)
+        self._state = threading.Condition()
+        self._unwritten = {}        # _id -> record, until written or spooled
+        self._in_flight = set()     # ids handed to insert_many
+        self._spool_lock = threading.Lock()
+        self._spool_path = os.path.join(PERSIST_SPOOL_DIR, f"{os.getpid()}.jsonl")
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "spooled": 0,
+                      "spooled_updates": 0, "replayed": 0, "failed_batches": 0}
+
+        threading.Thread(target=self._run, name="db-writer", daemon=True).start()
+
+    def _count(self, name, n=1):
+        with self._state:
+            self.stats[name] += n
+
+    # -----------------------------
+    # Writer
+    # -----------------------------
+
+    def _run(self):
+        self._replay()
+        while True:
+            try:
+                first = self._queue.get(timeout=PERSIST_REPLAY_INTERVAL)
+            except queue.Empty:
+                self._replay()
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + PERSIST_FLUSH_INTERVAL
+            while len(batch) < PERSIST_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self._state:
+                self._in_flight.update(doc["_id"] for _, doc in batch)
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"❌ Write-behind batch failed: {e}")
+                self._spool(batch)
+            finally:
+                with self._state:
+                    for _, doc in batch:
+                        self._in_flight.discard(doc["_id"])
+                        self._unwritten.pop(doc["_id"], None)
+                    self._state.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _insert(self, name, docs):
+        """insert_many; returns the records that weren't written"""
+        collection = get_db()[name].with_options(write_concern=_write_concern())
+        try:
+            collection.insert_many(docs, ordered=False)
+            return []
+        except BulkWriteError as e:
+            # Already there (e.g. a replay): written as far as we care
+            failed = [docs[err["index"]] for err in e.details.get("writeErrors", [])
+                      if err.get("code") != _DUPLICATE_KEY]
+            if e.details.get("writeConcernErrors"):
+                print(f"✗ Write concern not met for {len(docs)} {name} records: "
+                      f"{e.details['writeConcernErrors'][0].get('errmsg')}")
+            return failed
+        except PyMongoError as e:
+            print(f"✗ Could not write {len(docs)} {name} records, spooling: {e}")
+            return docs
+
+    def _write(self, batch):
+        by_collection = {}
+        for name, doc in batch:
+            by_collection.setdefault(name, []).append(doc)
+
+        for name, docs in by_collection.items():
+            failed = self._insert(name, docs)
+            self._count("batches")
+            self._count("written", len(docs) - len(failed))
+            if failed:
+                self._count("failed_batches")
+                self._spool([(name, doc) for doc in failed])
+
+    # -----------------------------
+    # Spool
+    # -----------------------------
+
+    def _spool(self, items):
+        self._append_spool([{"collection": name, "doc": doc} for name, doc in items])
+        self._count("spooled", len(items))
+
+    def _spool_update(self, name, doc_id, fields):
+        self._append_spool([{"collection": name, "update": doc_id, "fields": fields}])
+        self._count("spooled_updates")
+
+    def _append_spool(self, entries):
+        lines = "".join(json_util.dumps(entry) + "\n" for entry in entries)
+        with self._spool_lock:
+            os.makedirs(PERSIST_SPOOL_DIR, exist_ok=True)
+            with open(self._spool_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _claim_spools(self):
+        """Spool files to replay: this process's own and those of dead processes"""
+        if not os.path.isdir(PERSIST_SPOOL_DIR):
+            return []
+
+        claimed = []
+        for name in os.listdir(PERSIST_SPOOL_DIR):
+            stem = name.split(".", 1)[0]
+            if not stem.isdigit():
+                continue
+            path = os.path.join(PERSIST_SPOOL_DIR, name)
+            if int(stem) != os.getpid() and _pid_alive(int(stem)):
+                continue
+            # The rename is the claim: only one process gets each file
+            target = os.path.join(PERSIST_SPOOL_DIR, f"replay-{os.getpid()}-{len(claimed)}-{name}")
+            try:
+                with self._spool_lock:
+                    os.replace(path, target)
+            except OSError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    def _replay(self):
+        try:
+            paths = self._claim_spools()
+        except OSError as e:
+            print(f"✗ Could not read the write spool: {e}")
+            return
+
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                items = [json_util.loads(line) for line in f if line.strip()]
+
+            # Inserts first: an update can be spooled ahead of its record
+            # (e.g. when the record's first replay failed)
+            inserts = [item for item in items if "doc" in item]
+            retried = set()
+            for i in range(0, len(inserts), PERSIST_BATCH_SIZE):
+                self._replay_inserts(inserts[i:i + PERSIST_BATCH_SIZE], retried)
+            for item in items:
+                if "update" in item:
+                    self._replay_update(item, retried)
+            os.remove(path)
+
+            if items:
+                print(f"✓ Replayed {len(items)} spooled records")
+
+    def _replay_inserts(self, items, retried):
+        """Insert spooled records; ids spooled again are added to `retried`"""
+        by_collection = {}
+        for item in items:
+            by_collection.setdefault(item["collection"], []).append(item["doc"])
+        for name, docs in by_collection.items():
+            failed = self._insert(name, docs)
+            self._count("replayed", len(docs) - len(failed))
+            if failed:
+                retried.update(doc["_id"] for doc in failed)
+                self._spool([(name, doc) for doc in failed])
+
+    def _replay_update(self, item, retried):
+        name, doc_id = item["collection"], item["update"]
+        try:
+            matched = get_db()[name].update_one({"_id": doc_id}, {"$set": item["fields"]}).matched_count
+        except PyMongoError as e:
+            print(f"✗ Could not apply a spooled update to {name} {doc_id}, spooling: {e}")
+            self._spool_update(name, doc_id, item["fields"])
+            return
+        if matched:
+            return
+        # Its insert went back to the spool: keep the update behind it
+        if doc_id in retried:
+            self._spool_update(name, doc_id, item["fields"])
+        else:
+            print(f"✗ Dropped a spooled update for missing {name} {doc_id}")
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+
+    def insert(self, name, doc):
+        doc.setdefault("_id", ObjectId())
+        with self._state:
+            self._unwritten[doc["_id"]] = doc
+        try:
+            self._queue.put_nowait((name, doc))
+        except queue.Full:
+            # The database is falling behind: keep the record on disk instead
+            with self._state:
+                self._unwritten.pop(doc["_id"], None)
+            self._spool([(name, doc)])
+            return doc["_id"]
+        self._count("queued")
+        return doc["_id"]
+
+    def update_unwritten(self, doc_id, fields):
+        """Set fields on a queued record; False once the writer has taken it"""
+        with self._state:
+            doc = self._unwritten.get(doc_id)
+            if doc is None or doc_id in self._in_flight:
+                return False
+            doc.update(fields)
+            return True
+
+    def get_unwritten(self, doc_id):
+        with self._state:
+            doc = self._unwritten.get(doc_id)
+            return dict(doc) if doc is not None else None
+
+    def update(self, name, doc_id, fields):
+        """Set fields on a record wherever it is: queued, written or spooled"""
+        if self.update_unwritten(doc_id, fields):
+            return
+        self.wait_written(doc_id, PERSIST_SHUTDOWN_WAIT)
+        try:
+            matched = get_db()[name].update_one({"_id": doc_id}, {"$set": fields}).matched_count
+        except PyMongoError as e:
+            print(f"✗ Could not update {name} {doc_id}, spooling: {e}")
+            matched = 0
+        if not matched:
+            # Spooled (or the database is down): applied after the insert on replay
+            self._spool_update(name, doc_id, fields)
+
+    def wait_written(self, doc_id, timeout):
+        """Block until the record was written (or spooled); False on timeout"""
+        with self._state:
+            return self._state.wait_for(lambda: doc_id not in self._unwritten, timeout)
+
+    def flush(self, timeout):
+        """Wait for everything queued so far; spool what is left after timeout"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._spool(leftover)
+            with self._state:
+                for _, doc in leftover:
+                    self._unwritten.pop(doc["_id"], None)
+                self._state.notify_all()
+        return not leftover
+
+    def snapshot(self):
+        with self._state:
+            return dict(self.stats, pending=len(self._unwritten))
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    """Process-wide writer; forked workers start their own"""
+    global _writer, _writer_pid
+
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = WriteBehind()
+            _writer_pid = os.getpid()
+        return _writer
+
+
+def insert_later(collection_name, doc):
+    """
+    Queue `doc` for insertion into `collection_name` and return its _id
+    (assigned here when missing). With PERSIST_ASYNC off it is inserted
+    right away instead.
+    """
+    if not PERSIST_ASYNC:
+        doc.setdefault("_id", ObjectId())
+        get_db()[collection_name].with_options(write_concern=_write_concern()).insert_one(doc)
+        return doc["_id"]
+    return _get_writer().insert(collection_name, doc)
+
+
+def update_unwritten(doc_id, fields):
+    """Apply `fields` to a record still waiting in the queue (True if it was)"""
+    return PERSIST_ASYNC and _get_writer().update_unwritten(doc_id, fields)
+
+
+def update_later(collection_name, doc_id, fields):
+    """
+    $set `fields` on a record queued with insert_later, wherever it is:
+    still queued, in the database, or spooled (then applied on replay).
+    """
+    if not PERSIST_ASYNC:
+        get_db()[collection_name].update_one({"_id": doc_id}, {"$set": fields})
+        return
+    _get_writer().update(collection_name, doc_id, fields)
+
+
+def get_unwritten(doc_id):
+    """A copy of a queued record not yet in the database, or None"""
+    return _get_writer().get_unwritten(doc_id) if PERSIST_ASYNC else None
+
+
+def wait_written(doc_id, timeout=PERSIST_SHUTDOWN_WAIT):
+    return _get_writer().wait_written(doc_id, timeout) if PERSIST_ASYNC else True
+
+
+def flush_writes(timeout=PERSIST_SHUTDOWN_WAIT):
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer.flush(timeout)
+    return True
+
+
+def write_behind_stats():
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer.snapshot()
+    return None
+
+
+atexit.register(flush_writes)
@@ -0,0 +1,763 @@
+"""
+Embedded Storage Backend
+A single-file SQLite database (WAL mode) that stands in for MongoDB when
+DB_BACKEND=sqlite, for single-node deployments and CI. It implements the
+part of the pymongo Database/Collection API this app uses, so the
+`get_*_collection` helpers return either one.
+
+Each collection is a table of JSON documents. create_index() becomes a
+SQLite expression index, and filters, sorts and limits on plain values are
+pushed down to SQL, so an indexed query reads only the rows it returns.
+The rest is evaluated in Python. Datetimes are stored with millisecond
+precision and ObjectIds as hex, so sort order matches MongoDB's. Equality
+on a field that holds an array (MongoDB's element match) isn't pushed
+down correctly; nothing in the app queries arrays that way.
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# NORMAL is durable across application crashes in WAL mode; FULL also
+# survives power loss
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# How often TTL indexes are enforced, like MongoDB's TTL monitor
+TTL_INTERVAL = 60
+
+_EPOCH = datetime(1970, 1, 1)
+_DUPLICATE_KEY = 11000
+
+
+# -----------------------------
+# ENCODING
+# -----------------------------
+
+def _encode(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return {'$date': (value - _EPOCH) // timedelta(milliseconds=1)}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode_hook(obj):
+    if len(obj) == 1:
+        if '$date' in obj and isinstance(obj['$date'], int):
+            return _EPOCH + timedelta(milliseconds=obj['$date'])
+        if '$oid' in obj:
+            return ObjectId(obj['$oid'])
+    return obj
+
+
+def _dumps(doc):
+    return json.dumps(_encode(doc), separators=(',', ':'))
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode_hook)
+
+
+def _key(value):
+    return json.dumps(_encode(value), sort_keys=True)
+
+
+def _sql_value(value):
+    """How a value compares inside SQLite, or None if it can't be pushed down"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (datetime, ObjectId)):
+        return next(iter(_encode(value).values()))
+    if isinstance(value, (str, int, float)):
+        return value
+    return None
+
+
+def _field_expr(field):
+    """SQL for a (dotted) field; dates compare as epoch ms, ObjectIds as hex"""
+    path = '$' + ''.join('."' + part.replace("'", "''") + '"' for part in field.split('.'))
+    return (f"COALESCE(json_extract(doc, '{path}.\"$date\"'), "
+            f"json_extract(doc, '{path}.\"$oid\"'), json_extract(doc, '{path}'))")
+
+
+# -----------------------------
+# QUERY MATCHING
+# -----------------------------
+
+_MISSING = object()
+
+
+def _get(doc, field):
+    value = doc
+    for part in field.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _compare(a, b):
+    """Ordering for $lt/$gt/$sort; values of different types don't compare"""
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return None
+
+
+def _match_value(value, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+        for op, arg in condition.items():
+            if op == '$ne':
+                if _match_value(value, arg):
+                    return False
+            elif op == '$in':
+                if not any(_match_value(value, a) for a in arg):
+                    return False
+            elif op == '$nin':
+                if any(_match_value(value, a) for a in arg):
+                    return False
+            elif op == '$exists':
+                if (value is not _MISSING) != bool(arg):
+                    return False
+            elif op in ('$lt', '$lte', '$gt', '$gte'):
+                if value is _MISSING or value is None:
+                    return False
+                order = _compare(value, arg)
+                if order is None or not {
+                    '$lt': order < 0, '$lte': order <= 0, '$gt': order > 0, '$gte': order >= 0
+                }[op]:
+                    return False
+            else:
+                raise OperationFailure(f"Unsupported query operator {op}")
+        return True
+
+    if value is _MISSING:
+        return condition is None
+    if isinstance(value, list) and not isinstance(condition, list):
+        return any(v == condition for v in value)
+    return value == condition
+
+
+def _matches(doc, query):
+    for field, condition in (query or {}).items():
+        if field == '$or':
+            if not any(_matches(doc, q) for q in condition):
+                return False
+        elif field == '$and':
+            if not all(_matches(doc, q) for q in condition):
+                return False
+        elif not _match_value(_get(doc, field), condition):
+            return False
+    return True
+
+
+def _to_sql(query):
+    """
+    (sql, params, exact) for the part of `query` SQLite can evaluate. The
+    SQL never excludes a matching document; `exact` means it also never
+    includes a non-matching one, so SQL alone can count, skip and limit.
+    """
+    clauses, params, exact = [], [], True
+
+    for field, condition in (query or {}).items():
+        if field == '$or':
+            branches = [_to_sql(q) for q in condition]
+            if not branches or any(not sql for sql, _, _ in branches):
+                exact = False
+                continue
+            clauses.append('(' + ' OR '.join(f'({sql})' for sql, _, _ in branches) + ')')
+            for _, branch_params, branch_exact in branches:
+                params.extend(branch_params)
+                exact = exact and branch_exact
+            continue
+        if field.startswith('$'):
+            exact = False
+            continue
+
+        expr = _field_expr(field)
+        if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            for op, arg in condition.items():
+                sql_op = {'$lt': '<', '$lte': '<=', '$gt': '>', '$gte': '>='}.get(op)
+                if sql_op and _sql_value(arg) is not None:
+                    clauses.append(f'{expr} {sql_op} ?')
+                    params.append(_sql_value(arg))
+                elif op == '$in' and arg and all(_sql_value(a) is not None for a in arg):
+                    clauses.append(f"{expr} IN ({', '.join('?' * len(arg))})")
+                    params.extend(_sql_value(a) for a in arg)
+                else:
+                    exact = False
+        elif field == '_id' and _sql_value(condition) is not None:
+            clauses.append('id = ?')
+            params.append(_key(condition))
+        elif _sql_value(condition) is not None:
+            clauses.append(f'{expr} = ?')
+            params.append(_sql_value(condition))
+        else:
+            exact = False
+
+    return ' AND '.join(clauses), params, exact
+
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if fields and any(fields.values()):
+        projected = {k: doc[k] for k in fields if k in doc}
+    else:
+        projected = {k: v for k, v in doc.items() if k not in fields}
+    if include_id and '_id' in doc:
+        projected['_id'] = doc['_id']
+    elif not include_id:
+        projected.pop('_id', None)
+    return projected
+
+
+def _sort_key(spec):
+    def key(doc):
+        return [_SortValue(_get(doc, field), direction) for field, direction in spec]
+    return key
+
+
+class _SortValue:
+    """Missing/None first, then by value; mixed types fall back to type name"""
+
+    __slots__ = ('value', 'direction')
+
+    def __init__(self, value, direction):
+        self.value = None if value is _MISSING else value
+        self.direction = direction
+
+    def _rank(self):
+        return (self.value is not None, type(self.value).__name__)
+
+    def __lt__(self, other):
+        a, b = (self, other) if self.direction > 0 else (other, self)
+        if a.value is None or b.value is None or _compare(a.value, b.value) is None:
+            return a._rank() < b._rank()
+        return a.value < b.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+# -----------------------------
+# UPDATES
+# -----------------------------
+
+def _parent(doc, field, create):
+    parts = field.split('.')
+    for part in parts[:-1]:
+        if part not in doc or not isinstance(doc[part], dict):
+            if not create:
+                return None, parts[-1]
+            doc[part] = {}
+        doc = doc[part]
+    return doc, parts[-1]
+
+
+def _apply_update(doc, update, inserting=False):
+    if not any(k.startswith('$') for k in update):
+        # Replacement document
+        replaced = {'_id': doc['_id']} if '_id' in doc else {}
+        replaced.update(copy.deepcopy(update))
+        return replaced
+
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for field, arg in fields.items():
+            if op in ('$set', '$setOnInsert'):
+                parent, name = _parent(doc, field, True)
+                parent[name] = copy.deepcopy(arg)
+            elif op == '$unset':
+                parent, name = _parent(doc, field, False)
+                if parent is not None:
+                    parent.pop(name, None)
+            elif op == '$inc':
+                parent, name = _parent(doc, field, True)
+                parent[name] = parent.get(name, 0) + arg
+            elif op == '$push':
+                parent, name = _parent(doc, field, True)
+                items = parent.setdefault(name, [])
+                if isinstance(arg, dict) and '$each' in arg:
+                    items.extend(copy.deepcopy(arg['$each']))
+                    if '$sort' in arg:
+                        spec = arg['$sort']
+                        items.sort(key=_sort_key(list(spec.items())) if isinstance(spec, dict)
+                                   else (lambda v: _SortValue(v, spec)))
+                    if '$slice' in arg:
+                        limit = arg['$slice']
+                        items[:] = items[:limit] if limit >= 0 else items[limit:]
+                else:
+                    items.append(copy.deepcopy(arg))
+            elif op == '$pull':
+                parent, name = _parent(doc, field, False)
+                if parent is not None and isinstance(parent.get(name), list):
+                    parent[name] = [
+                        item for item in parent[name]
+                        if not (_matches(item, arg) if isinstance(arg, dict) and isinstance(item, dict)
+                                else _match_value(item, arg))
+                    ]
+            else:
+                raise OperationFailure(f"Unsupported update operator {op}")
+    return doc
+
+
+def _upsert_seed(query):
+    """The equality fields of a filter, which an upserted document starts from"""
+    doc = {}
+    for field, condition in (query or {}).items():
+        if field.startswith('$'):
+            continue
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            continue
+        parent, name = _parent(doc, field, True)
+        parent[name] = copy.deepcopy(condition)
+    return doc
+
+
+# -----------------------------
+# AGGREGATION
+# -----------------------------
+
+def _eval(expr, doc):
+    if isinstance(expr, str) and expr.startswith('$'):
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, dict) and len(expr) == 1:
+        op, arg = next(iter(expr.items()))
+        if op == '$ifNull':
+            value = _eval(arg[0], doc)
+            return _eval(arg[1], doc) if value is None else value
+        raise OperationFailure(f"Unsupported expression operator {op}")
+    return expr
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        group_id = _eval(spec['_id'], doc)
+        group = groups.get(_key(group_id))
+        if group is None:
+            group = groups[_key(group_id)] = {'_id': group_id}
+            for field, acc in spec.items():
+                if field != '_id':
+                    group[field] = None if next(iter(acc)) in ('$min', '$max') else 0
+            group['__count'] = 0
+        group['__count'] += 1
+
+        for field, acc in spec.items():
+            if field == '_id':
+                continue
+            op, arg = next(iter(acc.items()))
+            value = _eval(arg, doc)
+            if op in ('$sum', '$avg'):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    group[field] += value
+            elif op in ('$min', '$max') and value is not None:
+                current = group[field]
+                if current is None or (value < current if op == '$min' else value > current):
+                    group[field] = value
+            else:
+                raise OperationFailure(f"Unsupported accumulator {op}")
+
+    results = []
+    for group in groups.values():
+        count = group.pop('__count')
+        for field, acc in spec.items():
+            if field != '_id' and next(iter(acc)) == '$avg':
+                group[field] = group[field] / count if count else None
+        results.append(group)
+    return results
+
+
+# -----------------------------
+# CURSOR
+# -----------------------------
+
+class EmbeddedCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction or 1)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def hint(self, index):
+        return self
+
+    def __iter__(self):
+        docs = self._collection._select(self._query, self._sort, self._skip, self._limit)
+        return (_project(doc, self._projection) for doc in docs)
+
+
+# -----------------------------
+# COLLECTION
+# -----------------------------
+
+class EmbeddedCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._table = '"' + name.replace('"', '""') + '"'
+
+    def with_options(self, **kwargs):
+        return self    # every write is committed before it returns
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+
+    def _rows(self, conn, query, sort=(), skip=0, limit=0):
+        """(id, doc) rows matching `query`, in `sort` order"""
+        where, params, exact = _to_sql(query)
+        sql = f'SELECT id, doc FROM {self._table}'
+        if where:
+            sql += f' WHERE {where}'
+        if sort:
+            sql += ' ORDER BY ' + ', '.join(
+                f"{_field_expr(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in sort
+            )
+        else:
+            sql += ' ORDER BY rowid'
+        if exact and (skip or limit):
+            sql += ' LIMIT ? OFFSET ?'
+            params = params + [limit or -1, skip]
+            skip = limit = 0
+
+        matched = 0
+        for row_id, text in conn.execute(sql, params):
+            doc = _loads(text)
+            if not exact and not _matches(doc, query):
+                continue
+            matched += 1
+            if matched <= skip:
+                continue
+            yield row_id, doc
+            if limit and matched >= skip + limit:
+                return
+
+    def _select(self, query, sort=(), skip=0, limit=0):
+        self.database._expire(self)
+        return [doc for _, doc in self._rows(self.database._conn(), query, sort, skip, limit)]
+
+    def _insert(self, conn, doc):
+        doc.setdefault('_id', ObjectId())
+        try:
+            conn.execute(f'INSERT INTO {self._table} (id, doc) VALUES (?, ?)', (_key(doc['_id']), _dumps(doc)))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})",
+                                    _DUPLICATE_KEY)
+
+    def _save(self, conn, row_id, doc):
+        try:
+            conn.execute(f'UPDATE {self._table} SET doc = ? WHERE id = ?', (_dumps(doc), row_id))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})",
+                                    _DUPLICATE_KEY)
+
+    def _update(self, query, update, upsert, many):
+        matched = modified = 0
+        upserted_id = None
+        with self.database._write() as conn:
+            for row_id, doc in list(self._rows(conn, query, limit=0 if many else 1)):
+                before = _dumps(doc)
+                updated = _apply_update(doc, update)
+                matched += 1
+                if _dumps(updated) != before:
+                    self._save(conn, row_id, updated)
+                    modified += 1
+
+            if not matched and upsert:
+                doc = _apply_update(_upsert_seed(query), update, inserting=True)
+                self._insert(conn, doc)
+                upserted_id = doc['_id']
+
+        raw = {'n': matched + (1 if upserted_id is not None else 0), 'nModified': modified}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    # -----------------------------
+    # pymongo API
+    # -----------------------------
+
+    def create_index(self, keys, unique=False, expireAfterSeconds=None, name=None, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = name or '_'.join(f'{field}_{direction}' for field, direction in keys)
+        columns = ', '.join(
+            f"{_field_expr(field)} {'DESC' if direction == -1 else 'ASC'}" for field, direction in keys
+        )
+        index = '"' + f'{self.name}.{name}'.replace('"', '""') + '"'
+        with self.database._write() as conn:
+            conn.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index} "
+                         f"ON {self._table} ({columns})")
+            if expireAfterSeconds is not None:
+                conn.execute('INSERT OR REPLACE INTO _ttl (collection, field, seconds) VALUES (?, ?, ?)',
+                             (self.name, keys[0][0], float(expireAfterSeconds)))
+        if expireAfterSeconds is not None:
+            self.database._ttl[self.name] = (keys[0][0], float(expireAfterSeconds))
+        return name
+
+    def insert_one(self, document):
+        with self.database._write() as conn:
+            self._insert(conn, document)
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents, ordered=True):
+        documents = list(documents)
+        errors = []
+        with self.database._write() as conn:
+            for index, doc in enumerate(documents):
+                try:
+                    self._insert(conn, doc)
+                except DuplicateKeyError as e:
+                    errors.append({'index': index, 'code': _DUPLICATE_KEY, 'errmsg': str(e), 'op': doc})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({
+                'writeErrors': errors, 'writeConcernErrors': [],
+                'nInserted': (errors[0]['index'] if ordered else len(documents) - len(errors)),
+                'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []
+            })
+        return InsertManyResult([doc['_id'] for doc in documents], True)
+
+    def find(self, filter=None, projection=None, **kwargs):
+        return EmbeddedCursor(self, filter, projection)
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        docs = self._select(filter, kwargs.get('sort') or (), 0, 1)
+        return _project(docs[0], projection) if docs else None
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        return self._update(filter, update, upsert, many=False)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        return self._update(filter, update, upsert, many=True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self._update(filter, replacement, upsert, many=False)
+
+    def find_one_and_update(self, filter, update, projection=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self.database._write() as conn:
+            rows = list(self._rows(conn, filter, kwargs.get('sort') or (), limit=1))
+            if rows:
+                row_id, doc = rows[0]
+                before = copy.deepcopy(doc)
+                after = _apply_update(doc, update)
+                self._save(conn, row_id, after)
+            elif upsert:
+                before = None
+                after = _apply_update(_upsert_seed(filter), update, inserting=True)
+                self._insert(conn, after)
+            else:
+                return None
+
+        result = after if return_document == ReturnDocument.AFTER else before
+        return _project(result, projection) if result is not None else None
+
+    def find_one_and_delete(self, filter, projection=None, **kwargs):
+        with self.database._write() as conn:
+            rows = list(self._rows(conn, filter, kwargs.get('sort') or (), limit=1))
+            if not rows:
+                return None
+            row_id, doc = rows[0]
+            conn.execute(f'DELETE FROM {self._table} WHERE id = ?', (row_id,))
+        return _project(doc, projection)
+
+    def delete_one(self, filter, **kwargs):
+        with self.database._write() as conn:
+            rows = list(self._rows(conn, filter, limit=1))
+            for row_id, _ in rows:
+                conn.execute(f'DELETE FROM {self._table} WHERE id = ?', (row_id,))
+        return DeleteResult({'n': len(rows)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self.database._write() as conn:
+            where, params, exact = _to_sql(filter)
+            if exact:
+                cursor = conn.execute(f'DELETE FROM {self._table}' + (f' WHERE {where}' if where else ''), params)
+                return DeleteResult({'n': cursor.rowcount}, True)
+            ids = [(row_id,) for row_id, _ in self._rows(conn, filter)]
+            conn.executemany(f'DELETE FROM {self._table} WHERE id = ?', ids)
+        return DeleteResult({'n': len(ids)}, True)
+
+    def count_documents(self, filter, **kwargs):
+        self.database._expire(self)
+        where, params, exact = _to_sql(filter)
+        if exact:
+            sql = f'SELECT COUNT(*) FROM {self._table}' + (f' WHERE {where}' if where else '')
+            return self.database._conn().execute(sql, params).fetchone()[0]
+        return sum(1 for _ in self._rows(self.database._conn(), filter))
+
+    def estimated_document_count(self, **kwargs):
+        return self.database._conn().execute(f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = {}
+        for doc in self._select(filter):
+            value = _get(doc, key)
+            for v in (value if isinstance(value, list) else [value]):
+                if v is not _MISSING:
+                    values.setdefault(_key(v), v)
+        return list(values.values())
+
+    def aggregate(self, pipeline, **kwargs):
+        stages = list(pipeline)
+        query = stages.pop(0)['$match'] if stages and '$match' in stages[0] else {}
+        docs = self._select(query)
+
+        for stage in stages:
+            op, spec = next(iter(stage.items()))
+            if op == '$match':
+                docs = [doc for doc in docs if _matches(doc, spec)]
+            elif op == '$group':
+                docs = _group(docs, spec)
+            elif op == '$sort':
+                docs.sort(key=_sort_key(list(spec.items())))
+            elif op == '$limit':
+                docs = docs[:spec]
+            elif op == '$skip':
+                docs = docs[spec:]
+            elif op == '$project':
+                docs = [_project(doc, spec) for doc in docs]
+            else:
+                raise OperationFailure(f"Unsupported aggregation stage {op}")
+        return iter(docs)
+
+
+# -----------------------------
+# DATABASE
+# -----------------------------
+
+class EmbeddedDatabase:
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self._local = threading.local()
+        self._tables = set()
+        self._tables_lock = threading.Lock()
+        self._ttl = {}              # collection -> (field, seconds), also kept in _ttl
+        self._ttl_checked = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS _ttl (collection TEXT PRIMARY KEY, field TEXT, seconds REAL)')
+        for collection, field, seconds in conn.execute('SELECT collection, field, seconds FROM _ttl'):
+            self._ttl[collection] = (field, seconds)
+
+    def _conn(self):
+        """One connection per thread; SQLite connections can't be shared"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+            conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """One transaction; IMMEDIATE takes the write lock up front so
+        read-modify-write updates are atomic across threads and processes"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _ensure_table(self, name):
+        if name in self._tables:
+            return
+        with self._tables_lock:
+            if name not in self._tables:
+                table = '"' + name.replace('"', '""') + '"'
+                self._conn().execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, doc TEXT NOT NULL)'
+                )
+                self._tables.add(name)
+
+    def _expire(self, collection):
+        ttl = self._ttl.get(collection.name)
+        if ttl is None:
+            return
+        now = time.monotonic()
+        if now - self._ttl_checked.get(collection.name, 0) < TTL_INTERVAL:
+            return
+        self._ttl_checked[collection.name] = now
+
+        field, seconds = ttl
+        cutoff = _sql_value(datetime.utcnow() - timedelta(seconds=seconds))
+        with self._write() as conn:
+            conn.execute(f'DELETE FROM {collection._table} WHERE {_field_expr(field)} < ?', (cutoff,))
+
+    def __getitem__(self, name):
+        self._ensure_table(name)
+        return EmbeddedCollection(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def command(self, command, **kwargs):
+        if command == 'ping':
+            self._conn().execute('SELECT 1')
+            return {'ok': 1.0}
+        raise OperationFailure(f"Unsupported command {command}")
+
+    def list_collection_names(self):
+        rows = self._conn().execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return [name for (name,) in rows if name != '_ttl']
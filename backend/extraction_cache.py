@@ -0,0 +1,148 @@
+"""
+Extracted Text Cache
+On-disk, content-addressed store of text extracted from uploaded images
+and PDFs, keyed by the SHA-256 of the upload plus the extractor version,
+so a file seen before never reaches Tesseract again. Shared by every
+worker process on the host and bounded in size (least recently used
+entries are evicted first).
+"""
+
+import hashlib
+import os
+import threading
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+EXTRACTION_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', os.path.join('data', 'extraction_cache'))
+EXTRACTION_CACHE_MAX_MB = float(os.getenv('EXTRACTION_CACHE_MAX_MB', 200))
+
+# Eviction trims the store to this fraction of the limit, so it doesn't
+# run again on the very next write
+EVICT_TO = 0.9
+
+_lock = threading.Lock()
+_size = None    # bytes on disk as last seen by this process
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry_path(content_hash, version):
+    return os.path.join(EXTRACTION_CACHE_DIR, content_hash[:2], f"{content_hash}-{version}.txt")
+
+
+# -----------------------------
+# LOOKUP / STORE
+# -----------------------------
+
+def get_cached_text(content_hash, version):
+    """Extracted text for this upload and extractor version, or None"""
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+    path = _entry_path(content_hash, version)
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # mtime doubles as last-used time for eviction
+        os.utime(path)
+    except OSError:
+        _count('misses')
+        return None
+
+    _count('hits')
+    return text
+
+
+def cache_text(content_hash, version, text):
+    if not EXTRACTION_CACHE_ENABLED:
+        return
+    path = _entry_path(content_hash, version)
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename: readers in other processes never see half a file
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp, path)
+    except OSError as e:
+        print("❌ Extraction cache store error:", e)
+        return
+
+    _count('stores')
+    _grow(os.path.getsize(path))
+
+
+# -----------------------------
+# EVICTION
+# -----------------------------
+
+def _scan():
+    entries = []
+    for root, _, files in os.walk(EXTRACTION_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _grow(added):
+    global _size
+
+    limit = EXTRACTION_CACHE_MAX_MB * (1 << 20)
+    with _lock:
+        if _size is not None:
+            _size += added
+            if _size <= limit:
+                return
+        # First write in this process, or over the limit: other processes
+        # write here too, so recount from disk before evicting
+        _size = None
+
+    entries = _scan()
+    size = sum(e[1] for e in entries)
+    evicted = 0
+
+    if size > limit:
+        for mtime, entry_size, path in sorted(entries):
+            if size <= limit * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            evicted += 1
+
+    with _lock:
+        _size = size
+        _stats['evictions'] += evicted
+
+
+def extraction_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['size_mb'] = round(_size / (1 << 20), 2) if _size is not None else None
+
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,187 @@
+"""
+Hugging Face Inference Client
+Keep-alive connection pool, jittered retries while the model is loading,
+and a circuit breaker that fails fast while the endpoint is unhealthy.
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# -----------------------------
+# Hugging Face Configuration
+# -----------------------------
+
+HF_API_TOKEN = os.getenv("HF_API_TOKEN")
+
+HF_MODEL_URL = os.getenv(
+    "HF_MODEL_URL",
+    "https://api-inference.huggingface.co/models/"
+    "mistralai/Mistral-7B-Instruct-v0.2"
+)
+
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", 3))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", 15))
+HF_POOL_SIZE = int(os.getenv("HF_POOL_SIZE", 10))
+
+# Retries for 503 "model is loading", with full-jitter exponential backoff
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", 2))
+HF_BACKOFF_BASE = float(os.getenv("HF_BACKOFF_BASE", 0.5))
+HF_BACKOFF_MAX = float(os.getenv("HF_BACKOFF_MAX", 4))
+
+# Consecutive failures that open the breaker, and seconds before a trial call
+HF_BREAKER_THRESHOLD = int(os.getenv("HF_BREAKER_THRESHOLD", 5))
+HF_BREAKER_RESET = float(os.getenv("HF_BREAKER_RESET", 30))
+
+RETRY_STATUSES = {503}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class HuggingFaceClient:
+    """
+    Thread-safe client for one text-generation endpoint.
+
+    generate() returns the decoded JSON body, or None when the call failed
+    or was short-circuited by the open breaker; callers then use their
+    fallback.
+    """
+
+    def __init__(self, url=HF_MODEL_URL, token=HF_API_TOKEN,
+                 connect_timeout=HF_CONNECT_TIMEOUT, read_timeout=HF_READ_TIMEOUT,
+                 pool_size=HF_POOL_SIZE, max_retries=HF_MAX_RETRIES,
+                 backoff_base=HF_BACKOFF_BASE, backoff_max=HF_BACKOFF_MAX,
+                 breaker_threshold=HF_BREAKER_THRESHOLD, breaker_reset=HF_BREAKER_RESET):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.stats = {
+            'requests': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+            'client_errors': 0, 'short_circuited': 0, 'breaker_opened': 0
+        }
+
+    # -----------------------------
+    # Circuit breaker
+    # -----------------------------
+
+    def _allow_request(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.breaker_reset:
+                self._state = HALF_OPEN
+
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_running:
+                # Only one trial call probes a recovering endpoint
+                self._trial_running = True
+                return True
+
+            self.stats['short_circuited'] += 1
+            return False
+
+    def _record(self, success, counter=None):
+        with self._lock:
+            self._trial_running = False
+            if success:
+                self.stats[counter or 'successes'] += 1
+                self._state = CLOSED
+                self._failures = 0
+                return
+
+            self.stats['failures'] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.breaker_threshold:
+                if self._state != OPEN:
+                    self.stats['breaker_opened'] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    # -----------------------------
+    # Requests
+    # -----------------------------
+
+    def generate(self, payload):
+        if not self._allow_request():
+            return None
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                with self._lock:
+                    self.stats['requests'] += 1
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    with self._lock:
+                        self.stats['retries'] += 1
+                    time.sleep(self._backoff(attempt))
+                    continue
+                break
+
+            if response.status_code == 200:
+                data = response.json()
+                self._record(True)
+                return data
+
+            print(f"❌ Hugging Face returned {response.status_code}")
+            if response.status_code >= 500 or response.status_code == 429:
+                self._record(False)
+            else:
+                # Bad token or payload: the endpoint itself is healthy
+                self._record(True, counter='client_errors')
+        except Exception as e:
+            print("❌ Hugging Face AI error:", e)
+            self._record(False)
+
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, state=self._state, consecutive_failures=self._failures)
+
+
+# -----------------------------
+# Shared client
+# -----------------------------
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_hf_client():
+    """Process-wide client; a forked worker gets its own connection pool"""
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = HuggingFaceClient()
+            _client_pid = os.getpid()
+        return _client
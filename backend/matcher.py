@@ -0,0 +1,161 @@
+"""
+Single-pass Multi-pattern Matcher
+Compiles every keyword and pattern rule into one trie-shaped regex so the
+offer text is lowercased once and scanned once, whatever the rule count.
+"""
+
+import re
+
+# -----------------------------
+# RULE KINDS
+# -----------------------------
+
+# Substring presence: each term is reported once if it appears anywhere.
+KEYWORDS = 'keywords'
+
+# Whole-word alternation, same results as re.findall(r'\b(t1|t2|...)\b').
+WORDS = 'words'
+
+# Repeated character, e.g. '!!' behaves like re.findall(r'!{2,}').
+RUN = 'run'
+
+_WORD_CHAR = re.compile(r'\w')
+
+
+# -----------------------------
+# TRIE REGEX
+# -----------------------------
+
+def _build_trie(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = True
+    return trie
+
+
+def _prefixes_in_trie(trie, term):
+    prefixes = []
+    node = trie
+    for i, ch in enumerate(term, 1):
+        node = node[ch]
+        if '' in node:
+            prefixes.append(term[:i])
+    return prefixes
+
+
+def _trie_to_regex(node):
+    """
+    Turns a trie into an alternation whose branches start with distinct
+    characters, so the regex engine never backtracks across terms and
+    always prefers the longest term at a given position.
+    """
+    branches = [re.escape(ch) + _trie_to_regex(child)
+                for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ''
+    if '' in node:
+        return '(?:' + '|'.join(branches) + ')?'
+    if len(branches) > 1:
+        return '(?:' + '|'.join(branches) + ')'
+    return branches[0]
+
+
+def _is_boundary(text, pos):
+    before = pos > 0 and _WORD_CHAR.match(text, pos - 1) is not None
+    after = pos < len(text) and _WORD_CHAR.match(text, pos) is not None
+    return before != after
+
+
+# -----------------------------
+# MATCHER
+# -----------------------------
+
+class PatternMatcher:
+    """
+    Precompiled matcher for a fixed set of named rules.
+
+    rules: iterable of (name, kind, terms). Terms are matched against the
+    lowercased text. For RUN rules each term is one character repeated
+    the minimum number of times, e.g. '!!'.
+    """
+
+    def __init__(self, rules):
+        self.names = []
+        self._kinds = {}
+        self._terms = {}
+        actions = {}
+
+        for name, kind, terms in rules:
+            if kind not in (KEYWORDS, WORDS, RUN):
+                raise ValueError(f"Unknown rule kind: {kind}")
+            terms = [t.lower() for t in terms if t]
+            if kind == RUN and any(len(set(t)) != 1 for t in terms):
+                raise ValueError(f"Run rule '{name}' needs single-character terms")
+
+            self.names.append(name)
+            self._kinds[name] = kind
+            self._terms[name] = terms
+            for index, term in enumerate(terms):
+                actions.setdefault(term, []).append((name, kind, index))
+
+        # Every term that can start where a longer term matched is one of
+        # its prefixes, so the longest hit at a position implies the rest.
+        trie = _build_trie(actions)
+        self._actions = actions
+        self._prefixes = {term: _prefixes_in_trie(trie, term) for term in actions}
+
+        pattern = _trie_to_regex(trie) or '(?!)'
+        self._search = re.compile(pattern).search
+
+    def scan(self, text):
+        """
+        Scans the text once and returns {rule name: hits}.
+
+        KEYWORDS hits are the terms present, in rule order. WORDS and RUN
+        hits are the matched strings, in the order re.findall would give.
+        """
+        text = text.lower()
+        found = {name: set() for name in self.names if self._kinds[name] == KEYWORDS}
+        hits = {name: [] for name in self.names}
+        next_free = {}
+
+        search = self._search
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            start = match.start()
+            pos = start + 1
+
+            chosen = {}
+            for term in self._prefixes[match.group()]:
+                end = start + len(term)
+                for name, kind, index in self._actions[term]:
+                    if kind == KEYWORDS:
+                        found[name].add(index)
+                        continue
+                    if start < next_free.get(name, 0):
+                        continue
+                    if kind == WORDS and not (
+                        _is_boundary(text, start) and _is_boundary(text, end)
+                    ):
+                        continue
+                    if name not in chosen or index < chosen[name][0]:
+                        chosen[name] = (index, end)
+
+            for name, (index, end) in chosen.items():
+                if self._kinds[name] == RUN:
+                    char = text[start]
+                    while end < len(text) and text[end] == char:
+                        end += 1
+                hits[name].append(text[start:end])
+                next_free[name] = end
+
+        for name, indexes in found.items():
+            hits[name] = [t for i, t in enumerate(self._terms[name]) if i in indexes]
+
+        return hits
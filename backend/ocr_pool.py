@@ -0,0 +1,197 @@
+"""
+OCR Worker Pool
+Long-lived OCR workers behind a bounded queue. Each worker keeps one
+tesserocr (Tesseract API) handle per language, so the language data is
+loaded once per worker instead of once per page. Where tesserocr can't be
+installed, workers fall back to the tesseract CLI through pytesseract,
+which still bounds concurrency and enforces timeouts but starts a process
+per page.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:     # falls back to the tesseract CLI (see OCRPool)
+    tesserocr = None
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', 2))
+
+# Pages waiting for a worker, and how long a caller waits for a free slot
+OCR_QUEUE_SIZE = int(os.getenv('OCR_QUEUE_SIZE', 16))
+OCR_QUEUE_WAIT = float(os.getenv('OCR_QUEUE_WAIT', 5))
+
+# Longest one page may take, queueing included
+OCR_JOB_TIMEOUT = float(os.getenv('OCR_JOB_TIMEOUT', 60))
+
+OCR_ENGINE = 'tesserocr' if tesserocr is not None else 'tesseract-cli'
+
+# How helper processes that OCR (the PDF page pool) are started: forking a
+# threaded app worker could copy a lock some other thread holds
+PROCESS_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+
+class OCRBusy(Exception):
+    """The OCR queue stayed full; the caller should retry later"""
+
+
+class OCRTimeout(Exception):
+    """A page was not recognised within OCR_JOB_TIMEOUT"""
+
+
+def _open_api(lang):
+    """One Tesseract handle per worker; loading the model is the slow part"""
+    kwargs = {'lang': lang}
+    if os.environ.get('TESSDATA_PREFIX'):
+        kwargs['path'] = os.environ['TESSDATA_PREFIX']
+    return tesserocr.PyTessBaseAPI(**kwargs)
+
+
+class OCRPool:
+    def __init__(self, workers=OCR_WORKERS, queue_size=OCR_QUEUE_SIZE, slots=None):
+        self._jobs = queue.Queue(maxsize=queue_size)
+        # Held while a page is recognised; shared with the PDF page processes
+        self._slots = slots if slots is not None else ocr_slots()
+        self._lock = threading.Lock()
+        self.stats = {'jobs': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0}
+
+        if tesserocr is None:
+            print("⚠️ tesserocr is not installed: OCR falls back to the tesseract CLI, one process per page")
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f'ocr-worker-{i}', daemon=True).start()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # -----------------------------
+    # Workers
+    # -----------------------------
+
+    def _worker(self):
+        apis = {}   # lang -> Tesseract handle
+        while True:
+            image, lang, psm, config, future = self._jobs.get()
+            try:
+                # Waits for a page slot shared with the PDF page processes
+                with self._slots:
+                    # Caller already gave up while the page was queued
+                    if not future.set_running_or_notify_cancel():
+                        continue
+
+                    try:
+                        if tesserocr is not None:
+                            api = apis.get(lang)
+                            if api is None:
+                                api = apis[lang] = _open_api(lang)
+                            api.SetPageSegMode(psm)
+                            api.SetImage(Image.fromarray(image))
+                            # Tesseract stops by itself, freeing the worker
+                            if not api.Recognize(timeout=int(OCR_JOB_TIMEOUT * 1000)):
+                                raise OCRTimeout(f"OCR took longer than {OCR_JOB_TIMEOUT}s")
+                            text = api.GetUTF8Text()
+                        else:
+                            text = pytesseract.image_to_string(
+                                image, lang=lang, config=config, timeout=OCR_JOB_TIMEOUT
+                            )
+                        future.set_result(text)
+                    except OCRTimeout as e:
+                        self._count('timeouts')
+                        future.set_exception(e)
+                    except Exception as e:
+                        self._count('errors')
+                        future.set_exception(e)
+            finally:
+                self._jobs.task_done()
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+
+    def recognize(self, image, lang, psm, oem_config):
+        """
+        OCR one preprocessed grayscale/binary array. Raises OCRBusy when no
+        queue slot frees up within OCR_QUEUE_WAIT, and OCRTimeout when the
+        page isn't done within OCR_JOB_TIMEOUT.
+        """
+        future = Future()
+        config = f"{oem_config} --psm {psm}"
+        try:
+            self._jobs.put((image, lang, psm, config, future), timeout=OCR_QUEUE_WAIT)
+        except queue.Full:
+            self._count('rejected')
+            raise OCRBusy("OCR queue is full")
+        self._count('jobs')
+
+        try:
+            return future.result(timeout=OCR_JOB_TIMEOUT)
+        except FutureTimeout:
+            # Dropped if still queued; a running page finishes unobserved
+            future.cancel()
+            self._count('timeouts')
+            raise OCRTimeout(f"OCR took longer than {OCR_JOB_TIMEOUT}s")
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, engine=OCR_ENGINE, queued=self._jobs.qsize())
+
+
+# -----------------------------
+# SHARED POOL
+# -----------------------------
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_slots = None
+_slots_pid = None
+_slots_lock = threading.Lock()
+
+
+def ocr_slots():
+    """
+    OCR_WORKERS page slots for this app worker. The PDF page processes it
+    starts get the same semaphore (share_ocr_slots), so pages recognised at
+    once stay within OCR_WORKERS across all of them.
+    """
+    global _slots, _slots_pid
+
+    with _slots_lock:
+        if _slots is None or _slots_pid != os.getpid():
+            _slots = PROCESS_CONTEXT.BoundedSemaphore(OCR_WORKERS)
+            _slots_pid = os.getpid()
+        return _slots
+
+
+def share_ocr_slots(slots):
+    """Page process initializer: OCR against the parent's slots"""
+    global _slots, _slots_pid
+
+    with _slots_lock:
+        _slots, _slots_pid = slots, os.getpid()
+
+
+def get_ocr_pool():
+    """Process-wide pool; forked app workers and PDF page processes start their own"""
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = OCRPool()
+            _pool_pid = os.getpid()
+        return _pool
@@ -5,6 +5,8 @@ import numpy as np
 from PIL import Image
 import os
 
+from backend.ocr_pool import get_ocr_pool, OCR_ENGINE
+
 # ===============================
 # CONFIGURE TESSERACT PATHS
 # ===============================
@@ -15,17 +17,162 @@ pytesseract.pytesseract.tesseract_cmd = r"D:\SOFTWARES\tesseract.exe"
 # Tell Tesseract where trained data lives
 os.environ["TESSDATA_PREFIX"] = r"D:\SOFTWARES\tessdata"
 
+# ===============================
+# OCR SETTINGS
+# ===============================
+
+# Images above this resolution are downsampled before OCR; the long side
+# is also capped for images without DPI metadata
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", 300))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", 3500))
+
+# An image counts as clean (screenshot, digital document) when this share
+# of its pixels sits exactly on the background level
+OCR_CLEAN_BACKGROUND = float(os.getenv("OCR_CLEAN_BACKGROUND", 0.5))
+
+CROP_MARGIN = 12
+
+# Long side of the reduced copy text regions are detected on
+LAYOUT_SIDE = 1200
+
+TESSERACT_LANG = "eng"
+TESSERACT_OEM = "--oem 3"
+
+PSM_AUTO = 3        # multi-column layout
+PSM_BLOCK = 6       # one uniform block of text
+PSM_LINE = 7        # a single line
+PSM_SPARSE = 11     # scattered text: flyers, diagrams
+
+# Bump when preprocessing changes; part of the extractor version (see file_utils)
+PREPROCESS_VERSION = 2
+OCR_SETTINGS = (PREPROCESS_VERSION, OCR_ENGINE, TESSERACT_LANG, TESSERACT_OEM, OCR_TARGET_DPI,
+                OCR_MAX_SIDE, OCR_CLEAN_BACKGROUND)
+
 # ===============================
 # IMAGE PREPROCESSING
 # ===============================
 
-def preprocess_image(image_path):
-    image = cv2.imread(image_path)
+def _load(image):
+    """File path, PIL image or NumPy array -> (8-bit grayscale array, dpi or None)"""
+    if isinstance(image, (str, os.PathLike)):
+        try:
+            with Image.open(os.fspath(image)) as img:
+                img.load()
+                return _load(img)
+        except (OSError, ValueError):
+            raise ValueError("Unable to read image for OCR")
+
+    if isinstance(image, Image.Image):
+        dpi = image.info.get("dpi")
+        if image.mode != "L":
+            image = image.convert("L")
+        return np.asarray(image), (float(dpi[0]) if dpi and dpi[0] else None)
+
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return image, None
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY), None
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), None
+
+    raise ValueError("Unsupported image for OCR")
+
+
+def _downsample(gray, dpi):
+    scale = 1.0
+    if dpi and dpi > OCR_TARGET_DPI:
+        scale = OCR_TARGET_DPI / dpi
+    longest = max(gray.shape)
+    if longest * scale > OCR_MAX_SIDE:
+        scale = OCR_MAX_SIDE / longest
+    if scale >= 1.0:
+        return gray
+    size = (max(1, int(gray.shape[1] * scale)), max(1, int(gray.shape[0] * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def _is_clean(gray):
+    """Digital images have a flat background; scans and photos don't"""
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    return float(hist.max()) / gray.size >= OCR_CLEAN_BACKGROUND
 
-    if image is None:
-        raise ValueError("Unable to read image for OCR")
 
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def _text_boxes(gray):
+    """Bounding boxes (x, y, w, h) of word/line-like regions"""
+    # Layout only needs a coarse view: detect on a reduced copy
+    scale = min(1.0, LAYOUT_SIDE / max(gray.shape))
+    small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    # Remove frames, rules and arrows so they don't chain text lines together
+    for kernel in ((41, 1), (1, 41)):
+        lines = cv2.morphologyEx(edges, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, kernel))
+        edges = cv2.subtract(edges, lines)
+
+    # Join the letters of a word/line into one blob
+    joined = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    height = small.shape[0]
+    boxes = [cv2.boundingRect(c) for c in contours]
+    # Drop specks and photos/blocks much taller than a line of text
+    boxes = [b for b in boxes if 4 <= b[3] <= max(48, height // 8) and b[2] >= 4]
+    return [tuple(int(v / scale) for v in b) for b in boxes]
+
+
+def _crop(gray, boxes):
+    if not boxes:
+        return gray, boxes
+    x0 = max(0, min(b[0] for b in boxes) - CROP_MARGIN)
+    y0 = max(0, min(b[1] for b in boxes) - CROP_MARGIN)
+    x1 = min(gray.shape[1], max(b[0] + b[2] for b in boxes) + CROP_MARGIN)
+    y1 = min(gray.shape[0], max(b[1] + b[3] for b in boxes) + CROP_MARGIN)
+    return gray[y0:y1, x0:x1], [(x - x0, y - y0, w, h) for x, y, w, h in boxes]
+
+
+def _choose_psm(shape, boxes):
+    """Tesseract page segmentation mode from the text-region layout"""
+    if not boxes:
+        return PSM_BLOCK
+
+    height, width = shape
+    tops = min(b[1] for b in boxes)
+    bottoms = max(b[1] + b[3] for b in boxes)
+    tallest = max(b[3] for b in boxes)
+    if bottoms - tops <= tallest * 1.5:
+        return PSM_LINE
+
+    # A vertical gutter no region crosses, with text on both sides
+    covered = np.zeros(width, dtype=bool)
+    for x, _, w, _ in boxes:
+        covered[x:x + w] = True
+    middle = covered[width // 5: width - width // 5]
+    if len(middle) and not middle.all():
+        gutter = width // 5 + int(np.argmin(middle))
+        left = sum(1 for b in boxes if b[0] + b[2] <= gutter)
+        right = sum(1 for b in boxes if b[0] >= gutter)
+        if left >= 3 and right >= 3:
+            return PSM_AUTO
+
+    text_area = sum(b[2] * b[3] for b in boxes)
+    if text_area < 0.15 * height * width:
+        return PSM_SPARSE
+    return PSM_BLOCK
+
+
+def _prepare(image):
+    """Preprocessed image plus the page segmentation mode to OCR it with"""
+    gray, dpi = _load(image)
+    gray = _downsample(gray, dpi)
+
+    gray, boxes = _crop(gray, _text_boxes(gray))
+    psm = _choose_psm(gray.shape, boxes)
+
+    # Screenshots and digital pages OCR best as they are
+    if _is_clean(gray):
+        return gray, psm
 
     # Noise reduction
     gray = cv2.medianBlur(gray, 3)
@@ -40,17 +187,26 @@ def preprocess_image(image_path):
         2
     )
 
-    return thresh
+    return thresh, psm
+
+
+def preprocess_image(image):
+    """
+    Accepts a file path, a PIL image or a NumPy array (BGR or grayscale),
+    so rasterised PDF pages never touch the disk. Oversized images are
+    downsampled, cropped to their text, and thresholded only when noisy.
+    """
+    return _prepare(image)[0]
 
 
 # ===============================
 # OCR FUNCTION
 # ===============================
 
-def extract_text_from_image(image_path):
-    processed = preprocess_image(image_path)
+def extract_text_from_image(image):
+    processed, psm = _prepare(image)
 
-    config = "--oem 3 --psm 6"
-    text = pytesseract.image_to_string(processed, lang="eng", config=config)
+    # Warm workers with bounded queue; may raise OCRBusy / OCRTimeout
+    text = get_ocr_pool().recognize(processed, TESSERACT_LANG, psm, TESSERACT_OEM)
 
     return text.strip()
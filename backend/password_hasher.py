@@ -0,0 +1,173 @@
+"""
+Password Hashing Pool
+Password hashes are deliberately slow, so they run on a small dedicated
+thread pool instead of the request threads (hashlib's scrypt and pbkdf2
+and bcrypt release the GIL while hashing). The pool accepts a bounded
+number of jobs; beyond that callers get HashingBusy right away and the
+route answers 429, so a login burst can't starve the rest of the app.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import bcrypt
+except ImportError:     # only needed for PASSWORD_HASH_METHOD=bcrypt
+    bcrypt = None
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+# "scrypt[:n:r:p]", "pbkdf2[:hash:iterations]" or "bcrypt[:rounds]".
+# Stored hashes made with other settings are upgraded on the next login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+
+# Jobs that may wait for a worker; more are rejected immediately
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 16))
+
+# Longest a request waits for its hash, queueing included
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
+BCRYPT_DEFAULT_ROUNDS = 12
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full (or too slow); the caller should retry later"""
+
+
+# -----------------------------
+# HASHES
+# -----------------------------
+
+def _bcrypt_rounds(method):
+    _, *args = method.split(':')
+    return int(args[0]) if args else BCRYPT_DEFAULT_ROUNDS
+
+
+def make_hash(password, method=PASSWORD_HASH_METHOD):
+    """Hash on the calling thread (the pool and the benchmark use this)"""
+    if method.split(':', 1)[0] == 'bcrypt':
+        if bcrypt is None:
+            raise RuntimeError("PASSWORD_HASH_METHOD=bcrypt needs the bcrypt package")
+        salt = bcrypt.gensalt(rounds=_bcrypt_rounds(method))
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('ascii')
+    return generate_password_hash(password, method=method)
+
+
+def check_hash(stored_hash, password):
+    if stored_hash.startswith('$2'):
+        if bcrypt is None:
+            raise RuntimeError("Verifying a bcrypt hash needs the bcrypt package")
+        return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('ascii'))
+    return check_password_hash(stored_hash, password)
+
+
+def _hash_params(stored_hash):
+    """Method and cost a stored hash was made with, e.g. 'scrypt:32768:8:1'"""
+    if stored_hash.startswith('$2'):
+        return f"bcrypt:{int(stored_hash.split('$')[2])}"
+    return stored_hash.split('$', 1)[0]
+
+
+@lru_cache(maxsize=None)
+def _configured_params(method):
+    # Hashing once spells out the defaults (e.g. "scrypt" -> "scrypt:32768:8:1")
+    if method.split(':', 1)[0] == 'bcrypt':
+        return f"bcrypt:{_bcrypt_rounds(method)}"
+    return _hash_params(generate_password_hash('', method=method))
+
+
+def needs_rehash(stored_hash):
+    """True when the hash was made with other settings than PASSWORD_HASH_METHOD"""
+    return _hash_params(stored_hash) != _configured_params(PASSWORD_HASH_METHOD)
+
+
+# -----------------------------
+# POOL
+# -----------------------------
+
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.stats = {'hashes': 0, 'checks': 0, 'rehashes': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HashingBusy("Too many password operations in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeout:
+            future.cancel()
+            self._count('timeouts')
+            raise HashingBusy(f"Password hashing took longer than {PASSWORD_HASH_TIMEOUT}s")
+
+    def hash(self, password):
+        self._count('hashes')
+        return self._run(make_hash, password)
+
+    def check(self, stored_hash, password):
+        self._count('checks')
+        return self._run(check_hash, stored_hash, password)
+
+    def rehash_later(self, password, save):
+        """Hash with the current settings in the background and pass it to save(); skipped when busy"""
+        def job():
+            new_hash = make_hash(password)
+            save(new_hash)
+            self._count('rehashes')
+
+        try:
+            future = self._submit(job)
+        except HashingBusy:
+            return False    # tried again on the next login
+        future.add_done_callback(_log_rehash_error)
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, method=PASSWORD_HASH_METHOD)
+
+
+def _log_rehash_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"❌ Password rehash failed: {future.exception()}")
+
+
+_hasher = None
+_hasher_pid = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Process-wide pool; forked workers start their own"""
+    global _hasher, _hasher_pid
+
+    with _hasher_lock:
+        if _hasher is None or _hasher_pid != os.getpid():
+            _hasher = PasswordHasher()
+            _hasher_pid = os.getpid()
+        return _hasher
@@ -0,0 +1,137 @@
+"""
+Analysis Result Cache
+Exact-repeat short-circuit: full rule results keyed by a fingerprint of
+the normalised text plus company email and website (or of the uploaded
+file's bytes), scoped to the rule-pack version that produced them.
+"""
+
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from backend.ai_cache import normalize_text
+from backend.database import get_result_cache_collection
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Seconds a stored verdict may be reused
+RESULT_CACHE_MAX_AGE = float(os.getenv('RESULT_CACHE_MAX_AGE', 24 * 3600))
+
+# In-process entries in front of the shared MongoDB tier
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 1000))
+
+_entries = OrderedDict()    # key -> (expires_at, {'text', 'result'})
+_lock = threading.Lock()
+_stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+# -----------------------------
+# FINGERPRINTS
+# -----------------------------
+
+def text_fingerprint(text, company_email=None, company_website=None):
+    parts = (
+        normalize_text(text),
+        (company_email or '').strip().lower(),
+        (company_website or '').strip().lower()
+    )
+    return 'text:' + hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(content_hash):
+    """Fingerprint of an upload from the SHA-256 of its bytes"""
+    return 'file:' + content_hash
+
+
+def _key(fingerprint, rule_pack_version):
+    # A new rule pack version never sees verdicts from the old one
+    return f"{fingerprint}:{rule_pack_version}"
+
+
+# -----------------------------
+# LOOKUP / STORE
+# -----------------------------
+
+def _remember(key, entry, expires_at):
+    with _lock:
+        _entries[key] = (expires_at, entry)
+        _entries.move_to_end(key)
+        while len(_entries) > RESULT_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def get_cached_result(fingerprint, rule_pack_version):
+    """
+    Return {'text', 'result'} for a fresh verdict, or None. The result is
+    a copy the caller may modify.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return None
+    key = _key(fingerprint, rule_pack_version)
+
+    with _lock:
+        cached = _entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return copy.deepcopy(cached[1])
+        if cached:
+            del _entries[key]
+
+    try:
+        doc = get_result_cache_collection().find_one({'_id': key})
+    except Exception as e:
+        print("❌ Result cache lookup error:", e)
+        doc = None
+
+    if doc:
+        age = (datetime.utcnow() - doc['created_at']).total_seconds()
+        if age < RESULT_CACHE_MAX_AGE:
+            entry = {'text': doc['text'], 'result': doc['result']}
+            _remember(key, entry, time.monotonic() + RESULT_CACHE_MAX_AGE - age)
+            _count('shared_hits')
+            return copy.deepcopy(entry)
+
+    _count('misses')
+    return None
+
+
+def cache_result(fingerprint, rule_pack_version, text, result):
+    if not RESULT_CACHE_ENABLED:
+        return
+    key = _key(fingerprint, rule_pack_version)
+    entry = {'text': text, 'result': copy.deepcopy(result)}
+    _remember(key, entry, time.monotonic() + RESULT_CACHE_MAX_AGE)
+    _count('stores')
+
+    try:
+        get_result_cache_collection().replace_one(
+            {'_id': key},
+            dict(entry, created_at=datetime.utcnow()),
+            upsert=True
+        )
+    except Exception as e:
+        print("❌ Result cache store error:", e)
+
+
+def result_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_entries)
+
+    lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+    return stats
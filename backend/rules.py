@@ -0,0 +1,161 @@
+"""
+Rule Pack Loader
+Loads versioned JSON rule packs, compiles them into an in-memory index and
+swaps the active index atomically when the pack file changes.
+"""
+
+import json
+import os
+import threading
+import time
+
+from backend.matcher import PatternMatcher, KEYWORDS, WORDS, RUN
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+DEFAULT_RULE_PACK = os.path.join(os.path.dirname(__file__), 'rule_packs', 'default.json')
+
+RULE_PACK_PATH = os.getenv('RULE_PACK_PATH', DEFAULT_RULE_PACK)
+
+# Seconds between checks of the pack file's modification time
+RULE_PACK_CHECK_INTERVAL = float(os.getenv('RULE_PACK_CHECK_INTERVAL', 5))
+
+PATTERN_GROUPS = ('urgency', 'grammar', 'financial')
+
+SCORING_CAPS = ('keyword', 'urgency', 'grammar', 'financial')
+SCORING_PENALTIES = ('free_email', 'website_unreachable', 'company_mismatch')
+
+
+class RulePackError(Exception):
+    """Raised when a rule pack file is missing fields or malformed"""
+
+
+# -----------------------------
+# COMPILED INDEX
+# -----------------------------
+
+class RuleIndex:
+    """
+    Immutable, compiled view of one rule pack. A new index is built for
+    every reload, so readers holding the old one are never affected.
+    """
+
+    def __init__(self, pack, source=None):
+        try:
+            self.version = str(pack['version'])
+            self.keywords = {c: list(k) for c, k in pack['keywords'].items()}
+            self.patterns = {g: list(pack['patterns'].get(g, [])) for g in PATTERN_GROUPS}
+            self.free_email_domains = frozenset(d.lower() for d in pack['free_email_domains'])
+
+            scoring = pack['scoring']
+            self.caps = {k: (scoring[k]['per_hit'], scoring[k]['max']) for k in SCORING_CAPS}
+            self.penalties = {k: scoring[k] for k in SCORING_PENALTIES}
+
+            self.safe_threshold = pack['risk_levels']['safe']
+            self.suspicious_threshold = pack['risk_levels']['suspicious']
+        except (KeyError, TypeError, AttributeError) as e:
+            raise RulePackError(f"Invalid rule pack {source or ''}: missing {e}")
+
+        self.source = source
+        try:
+            self.matcher = PatternMatcher(self._matcher_rules())
+        except ValueError as e:
+            raise RulePackError(f"Invalid rule pack {source or ''}: {e}")
+
+    def _matcher_rules(self):
+        rules = [(('keyword', category), KEYWORDS, keywords)
+                 for category, keywords in self.keywords.items()]
+
+        for group, entries in self.patterns.items():
+            for i, entry in enumerate(entries):
+                if 'words' in entry:
+                    rules.append(((group, i), WORDS, entry['words']))
+                elif 'run' in entry:
+                    rules.append(((group, i), RUN, [entry['run']]))
+                else:
+                    raise RulePackError(f"Pattern {group}[{i}] needs 'words' or 'run'")
+
+        return rules
+
+    def scan(self, text):
+        """Single pass over the text for every keyword and pattern rule"""
+        return self.matcher.scan(text)
+
+
+def load_rule_pack(path):
+    """Read and compile a rule pack file"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            pack = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulePackError(f"Cannot read rule pack {path}: {e}")
+
+    return RuleIndex(pack, source=path)
+
+
+# -----------------------------
+# ACTIVE INDEX (HOT RELOAD)
+# -----------------------------
+
+_index = None
+_loaded_mtime = None
+_failed_mtime = None
+_next_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def reload_rules(path=None):
+    """
+    Compile the pack at `path` (default RULE_PACK_PATH) and make it the
+    active index. On error the previous index stays active.
+    """
+    global _index, _loaded_mtime, RULE_PACK_PATH
+
+    with _reload_lock:
+        path = path or RULE_PACK_PATH
+        mtime = _mtime(path)
+        index = load_rule_pack(path)
+
+        # Single reference assignment: readers see the old or new index,
+        # never a half-built one.
+        _index = index
+        _loaded_mtime = mtime
+        RULE_PACK_PATH = path
+
+    print(f"✓ Loaded rule pack {index.version} from {path}")
+    return index
+
+
+def get_rules():
+    """
+    Return the active rule index, reloading it first if the pack file
+    changed since it was compiled.
+    """
+    global _next_check, _failed_mtime
+
+    index = _index
+    if index is None:
+        return reload_rules()
+
+    now = time.monotonic()
+    if now >= _next_check:
+        _next_check = now + RULE_PACK_CHECK_INTERVAL
+        mtime = _mtime(RULE_PACK_PATH)
+        if mtime != _loaded_mtime and mtime != _failed_mtime:
+            try:
+                return reload_rules()
+            except RulePackError as e:
+                # Don't retry the same broken file on every check
+                _failed_mtime = mtime
+                print(f"✗ Rule pack reload failed, keeping {index.version}: {e}")
+
+    return index
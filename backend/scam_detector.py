@@ -3,124 +3,120 @@ AI/NLP Scam Detection Engine
 Implements keyword detection, urgency analysis, red flags, and risk scoring
 """
 
-import re
-import requests
 from urllib.parse import urlparse
-import socket
+
+from backend.rules import get_rules
+from backend.site_verifier import get_verifier
 
 # -----------------------------
-# CONFIG
+# RULES
 # -----------------------------
+# Keywords, patterns, free email domains and scoring weights live in the
+# active rule pack (backend/rule_packs/default.json unless RULE_PACK_PATH
+# points elsewhere), see backend/rules.py.
+
+def scan_text(text, rules=None):
+    """Single pass over the text for every keyword and pattern rule"""
+    return (rules or get_rules()).scan(text)
 
-SCAM_KEYWORDS = {
-    'urgent': ['urgent', 'immediately', 'asap', 'right away', 'hurry', 'limited time', 'act now'],
-    'payment': ['pay', 'fee', 'deposit', 'payment', 'money', 'bitcoin', 'cryptocurrency'],
-    'too_good': ['guaranteed', 'no experience needed', 'easy money', 'high salary', 'no interview'],
-    'grammar_issues': ['kindly', 'revert back', 'do the needful'],
-    'personal_info': ['bank account', 'credit card', 'passport', 'ssn'],
-}
 
-FREE_EMAIL_DOMAINS = [
-    'gmail.com', 'yahoo.com', 'hotmail.com', 'outlook.com',
-    'aol.com', 'protonmail.com', 'icloud.com'
-]
+def _group_hits(scan, group):
+    return [hits for (kind, _), hits in scan.items() if kind == group]
 
 # -----------------------------
 # DETECTION HELPERS
 # -----------------------------
 
-def detect_scam_keywords(text):
-    text = text.lower()
+def _keywords_from_scan(scan):
     detected = {}
     score = 0
 
-    for category, keywords in SCAM_KEYWORDS.items():
-        hits = [k for k in keywords if k in text]
-        if hits:
+    for (kind, category), hits in scan.items():
+        if kind == 'keyword' and hits:
             detected[category] = hits
             score += len(hits)
 
     return detected, score
 
 
-def analyze_urgency_language(text):
-    patterns = [
-        r'\b(urgent|immediately|asap|hurry|act now)\b',
-        r'\b(deadline|expires|last chance)\b',
-        r'!{2,}'
-    ]
-
+def _urgency_from_scan(scan):
     matches = []
-    for p in patterns:
-        matches += re.findall(p, text.lower())
+    for hits in _group_hits(scan, 'urgency'):
+        matches += hits
 
     return len(matches), matches
 
 
-def analyze_grammar_quality(text):
-    issues = 0
-    patterns = [r'\bkindly\b', r'\brevert back\b', r'\bdo the needful\b']
-    for p in patterns:
-        if re.search(p, text.lower()):
-            issues += 1
-    return issues
+def _grammar_from_scan(scan):
+    return sum(1 for hits in _group_hits(scan, 'grammar') if hits)
 
 
-def detect_financial_red_flags(text):
-    patterns = [
-        r'\b(pay|payment|fee|deposit|charges)\b',
-        r'\b(bitcoin|crypto|wire transfer)\b',
-        r'\b(bank account|credit card)\b'
-    ]
-
+def _financial_from_scan(scan):
     matches = []
-    for p in patterns:
-        matches += re.findall(p, text.lower())
+    for hits in _group_hits(scan, 'financial'):
+        matches += hits
 
     return len(matches), matches
 
 
-def check_email_domain(email):
+def detect_scam_keywords(text):
+    return _keywords_from_scan(scan_text(text))
+
+
+def analyze_urgency_language(text):
+    return _urgency_from_scan(scan_text(text))
+
+
+def analyze_grammar_quality(text):
+    return _grammar_from_scan(scan_text(text))
+
+
+def detect_financial_red_flags(text):
+    return _financial_from_scan(scan_text(text))
+
+
+def check_email_domain(email, rules=None):
     if not email or '@' not in email:
         return False, None
     domain = email.split('@')[1].lower()
-    return domain in FREE_EMAIL_DOMAINS, domain
+    return domain in (rules or get_rules()).free_email_domains, domain
 
 
 def verify_website_exists(url):
-    try:
-        parsed = urlparse(url if url.startswith('http') else 'https://' + url)
-        domain = parsed.netloc
-        socket.gethostbyname(domain)
-        return True, "Website reachable"
-    except:
-        return False, "Website not reachable"
+    """DNS check through the shared cache, bounded by DNS_TIMEOUT"""
+    return get_verifier().verify(url)
 
 # -----------------------------
 # SCORING
 # -----------------------------
 
-def calculate_trust_score(keyword_score, urgency, grammar, financial, email_free, website_ok, company_match):
+def calculate_trust_score(keyword_score, urgency, grammar, financial, email_free, website_ok, company_match,
+                          rules=None):
+    rules = rules or get_rules()
+    caps = rules.caps
+    penalties = rules.penalties
+
     score = 100
-    score -= min(keyword_score * 5, 30)
-    score -= min(urgency * 5, 20)
-    score -= min(grammar * 5, 15)
-    score -= min(financial * 6, 25)
+    score -= min(keyword_score * caps['keyword'][0], caps['keyword'][1])
+    score -= min(urgency * caps['urgency'][0], caps['urgency'][1])
+    score -= min(grammar * caps['grammar'][0], caps['grammar'][1])
+    score -= min(financial * caps['financial'][0], caps['financial'][1])
 
     if email_free:
-        score -= 10
+        score -= penalties['free_email']
     if not website_ok:
-        score -= 15
+        score -= penalties['website_unreachable']
     if not company_match:
-        score -= 10
+        score -= penalties['company_mismatch']
 
     return max(0, min(100, score))
 
 
-def get_risk_level(score):
-    if score >= 80:
+def get_risk_level(score, rules=None):
+    rules = rules or get_rules()
+    if score >= rules.safe_threshold:
         return "Safe"
-    elif score >= 50:
+    elif score >= rules.suspicious_threshold:
         return "Suspicious"
     return "High Risk"
 
@@ -173,14 +169,27 @@ def generate_red_flags_and_recommendations(analysis):
 # MAIN ANALYSIS FUNCTION
 # -----------------------------
 
-def analyze_job_offer(text, company_email=None, company_website=None):
-    keywords, keyword_score = detect_scam_keywords(text)
-    urgency_score, urgency_matches = analyze_urgency_language(text)
-    grammar_issues = analyze_grammar_quality(text)
-    financial_count, financial_matches = detect_financial_red_flags(text)
+def _find_similar_offers(text):
+    # numpy is only imported when the stage is used
+    from backend.similarity import find_similar_offers
+    return find_similar_offers(text)
+
+
+def analyze_job_offer(text, company_email=None, company_website=None, find_similar=True):
+    # One index for the whole call, even if a reload swaps it meanwhile
+    rules = get_rules()
 
-    email_suspicious, email_domain = check_email_domain(company_email) if company_email else (False, None)
-    website_exists, website_status = verify_website_exists(company_website) if company_website else (False, None)
+    # Start the DNS lookup first so it overlaps with the text rules
+    website_check = get_verifier().check(company_website) if company_website else None
+
+    scan = scan_text(text, rules)
+    keywords, keyword_score = _keywords_from_scan(scan)
+    urgency_score, urgency_matches = _urgency_from_scan(scan)
+    grammar_issues = _grammar_from_scan(scan)
+    financial_count, financial_matches = _financial_from_scan(scan)
+
+    email_suspicious, email_domain = check_email_domain(company_email, rules) if company_email else (False, None)
+    website_exists, website_status = website_check.result() if website_check else (False, None)
 
     company_match = True
     if company_email and company_website:
@@ -195,10 +204,11 @@ def analyze_job_offer(text, company_email=None, company_website=None):
         financial_count,
         email_suspicious,
         website_exists,
-        company_match
+        company_match,
+        rules
     )
 
-    risk_level = get_risk_level(trust_score)
+    risk_level = get_risk_level(trust_score, rules)
     risk_color = get_risk_color(risk_level)
 
 
@@ -229,11 +239,15 @@ def analyze_job_offer(text, company_email=None, company_website=None):
         "financial_flags_count": financial_count,
         "email_domain_suspicious": email_suspicious,
         "website_exists": website_exists,
-        "company_match": company_match
+        "company_match": company_match,
+        "rule_pack_version": rules.version
     }
 
     red_flags, recommendations = generate_red_flags_and_recommendations(result)
     result["red_flags"] = red_flags
     result["recommendations"] = recommendations
 
+    # Near-duplicates of previously analysed offers and their verdicts
+    result["similar_offers"] = _find_similar_offers(text) if find_similar else []
+
     return result
@@ -0,0 +1,493 @@
+"""
+Near-duplicate Offer Index
+MinHash signatures with LSH banding over previously analysed offers.
+Signatures are appended to a memory-mapped file that every worker
+process reads, so the index survives restarts and is shared between
+workers. The sorted band tables used for lookups are kept in a second
+file next to it, built in the background and mapped by every worker.
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows: appends are not locked
+    fcntl = None
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+SIMILARITY_ENABLED = os.getenv('SIMILARITY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', os.path.join('data', 'similarity.idx'))
+
+# Minimum estimated Jaccard similarity reported, and how many offers
+SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.6))
+SIMILARITY_TOP_K = int(os.getenv('SIMILARITY_TOP_K', 5))
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 2
+SEED = 1729
+
+# Newest rows per bucket considered; keeps huge campaigns from slowing lookups
+MAX_BUCKET_CANDIDATES = 500
+
+# Unsorted rows held in the tail before the band tables are rebuilt
+TAIL_MERGE_ROWS = 20000
+
+# Seconds before retrying a band rebuild that failed or that another
+# process was already running
+REBUILD_RETRY = 5
+
+MAGIC = b'SCAMLSH2'
+MAGIC_V1 = b'SCAMLSH1'      # no record count; upgraded in place on open
+HEADER = np.dtype([('magic', 'S8'), ('num_perm', '<u4'), ('bands', '<u4'), ('seed', '<u4'),
+                   ('count', '<u4'), ('pad', 'S8')])
+COUNT_OFFSET = HEADER.fields['count'][1]
+RECORD = np.dtype([
+    ('analysis_id', 'u1', (12,)),
+    ('trust_score', 'u1'),
+    ('risk', 'u1'),
+    ('sig', '<u4', (NUM_PERM,)),
+])
+
+# Band tables file: header, then BANDS sorted key arrays, then BANDS row arrays
+BANDS_MAGIC = b'SCAMBND1'
+BANDS_HEADER = np.dtype([('magic', 'S8'), ('count', '<u8'), ('bands', '<u4'), ('pad', 'S12')])
+
+RISK_CODES = {'Safe': 0, 'Suspicious': 1, 'High Risk': 2}
+RISK_NAMES = {code: name for name, code in RISK_CODES.items()}
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(SEED)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_BAND_MIX = (_rng.randint(1, 1 << 31, size=ROWS, dtype=np.int64).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+
+_TOKEN = re.compile(r'\w+')
+
+
+# -----------------------------
+# SIGNATURES
+# -----------------------------
+
+def _shingles(text):
+    words = _TOKEN.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        words = words or ['']
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {
+        zlib.crc32(' '.join(words[i:i + SHINGLE_WORDS]).encode('utf-8'))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+_last_signature = threading.local()
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32 values) of the text's word 2-grams"""
+    last = getattr(_last_signature, 'value', None)
+    if last is not None and last[0] is text:
+        return last[1]
+
+    hashes = np.fromiter(_shingles(text), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        mixed = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE
+    sig = (mixed.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    # analyze and store usually see the same string back to back
+    _last_signature.value = (text, sig)
+    return sig
+
+
+def _band_hashes(sigs):
+    """(n, NUM_PERM) signatures -> (n, BANDS) uint64 band keys"""
+    bands = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return (bands * _BAND_MIX).sum(axis=2, dtype=np.uint64)
+
+
+def _band_column(sigs, band):
+    """(n, NUM_PERM) signatures -> (n,) uint64 keys of one band"""
+    rows = np.asarray(sigs[:, band * ROWS:(band + 1) * ROWS]).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        return (rows * _BAND_MIX).sum(axis=1, dtype=np.uint64)
+
+
+# -----------------------------
+# BAND TABLES
+# -----------------------------
+
+def _bands_path(path):
+    return path + '.bands'
+
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Exclusive lock on `path`; yields False when not blocking and it's taken"""
+    with open(path, 'a+b') as f:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_band_tables(path):
+    """(count, keys, rows, stamp) mapped from the band file, or None"""
+    try:
+        f = open(_bands_path(path), 'rb')
+    except FileNotFoundError:
+        return None
+
+    # One open file for the header and the maps: a concurrent replace can't mix files
+    with f:
+        st = os.fstat(f.fileno())
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        header = np.fromfile(f, dtype=BANDS_HEADER, count=1)
+        if len(header) != 1 or header[0]['magic'] != BANDS_MAGIC or header[0]['bands'] != BANDS:
+            return None
+        count = int(header[0]['count'])
+        if count == 0:
+            return 0, np.zeros((BANDS, 0), dtype=np.uint64), np.zeros((BANDS, 0), dtype=np.uint32), stamp
+        keys = np.memmap(f, dtype='<u8', mode='r', offset=BANDS_HEADER.itemsize, shape=(BANDS, count))
+        rows = np.memmap(f, dtype='<u4', mode='r', offset=BANDS_HEADER.itemsize + keys.nbytes,
+                         shape=(BANDS, count))
+    return count, keys, rows, stamp
+
+
+def build_band_tables(path, records, count, blocking=True):
+    """
+    Sort the band keys of the first `count` records into `<path>.bands`.
+    Bands are sorted one at a time straight into a mapped temp file, which
+    then replaces the old tables; readers keep using those until they map
+    the new file. Only one process builds at a time: with blocking=False
+    this returns False when another one is already at it.
+    """
+    target = _bands_path(path)
+    with _file_lock(target + '.lock', blocking) as locked:
+        if not locked:
+            return False
+        current = _load_band_tables(path)
+        if current is not None and current[0] >= count:
+            return True     # built meanwhile by another process
+
+        temp = f"{target}.{os.getpid()}.tmp"
+        keys_size = BANDS * count * 8
+        out = np.memmap(temp, dtype=np.uint8, mode='w+',
+                        shape=(BANDS_HEADER.itemsize + keys_size + BANDS * count * 4,))
+        try:
+            out[:BANDS_HEADER.itemsize].view(BANDS_HEADER)[0] = (BANDS_MAGIC, count, BANDS, b'')
+            keys_out = out[BANDS_HEADER.itemsize:BANDS_HEADER.itemsize + keys_size].view('<u8')
+            rows_out = out[BANDS_HEADER.itemsize + keys_size:].view('<u4')
+            sigs = records['sig'][:count]
+            for band in range(BANDS):
+                keys = _band_column(sigs, band)
+                # Stable sort keeps rows of one bucket in insertion order
+                order = np.argsort(keys, kind='stable')
+                keys_out[band * count:(band + 1) * count] = keys[order]
+                rows_out[band * count:(band + 1) * count] = order
+            out.flush()
+            del keys_out, rows_out, out
+            os.replace(temp, target)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+    return True
+
+
+# -----------------------------
+# INDEX
+# -----------------------------
+
+class SimilarityIndex:
+    """
+    Append-only LSH index over a memory-mapped record file.
+
+    The header holds the number of complete records: writers add rows
+    under an exclusive lock and raise the count last, so readers never see
+    a half-written record. Band keys of the first rows live in per-band
+    sorted tables (binary search per lookup) mapped from the band file;
+    rows appended since sit in small dict tails. Once the tails pass
+    TAIL_MERGE_ROWS, one worker rebuilds the tables in a background thread
+    and every worker maps the new file when it appears.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = np.zeros(0, dtype=RECORD)
+        self._sorted_keys = np.zeros((BANDS, 0), dtype=np.uint64)
+        self._sorted_rows = np.zeros((BANDS, 0), dtype=np.uint32)
+        self._sorted_count = 0
+        self._bands_stamp = None
+        self._tails = []        # [(first_row, [{key: [rows]} per band])], oldest first
+        self._count = 0
+        self._rebuilding = False
+        self._next_rebuild = 0.0
+
+        self._ensure_file()
+        self._header = np.memmap(self.path, dtype=HEADER, mode='r', shape=(1,))
+
+    def _ensure_file(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            header = np.fromfile(self.path, dtype=HEADER, count=1)
+            if len(header) != 1 or header[0]['magic'] not in (MAGIC, MAGIC_V1) \
+                    or header[0]['num_perm'] != NUM_PERM:
+                raise ValueError(f"{self.path} is not a compatible similarity index")
+            if header[0]['magic'] == MAGIC_V1:
+                self._upgrade_v1()
+            return
+
+        header = np.zeros(1, dtype=HEADER)
+        header[0] = (MAGIC, NUM_PERM, BANDS, SEED, 0, b'')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.tobytes())
+
+    def _upgrade_v1(self):
+        """Record the count of whole records in a file written before the header had one"""
+        with open(self.path, 'r+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if f.read(len(MAGIC)) != MAGIC_V1:
+                    return      # upgraded by another process
+                count = (os.fstat(f.fileno()).st_size - HEADER.itemsize) // RECORD.itemsize
+                f.seek(COUNT_OFFSET)
+                f.write(np.array([count], dtype='<u4').tobytes())
+                f.flush()
+                f.seek(0)
+                f.write(MAGIC)
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # -----------------------------
+    # Sync with the files
+    # -----------------------------
+
+    def _refresh(self):
+        """Pick up new band tables and rows appended since last look"""
+        self._load_bands()
+
+        # Read after the tables, which only ever cover committed rows
+        count = int(self._header[0]['count'])
+        if count > self._count:
+            self._records = np.memmap(self.path, dtype=RECORD, mode='r',
+                                      offset=HEADER.itemsize, shape=(count,))
+            # Without tables (e.g. a fresh worker on an old index) only the
+            # newest rows are searchable until the background build lands
+            first = max(self._count, self._sorted_count, count - TAIL_MERGE_ROWS)
+            if not self._tails or first > self._count:
+                self._tails.append((first, [{} for _ in range(BANDS)]))
+            tail = self._tails[-1][1]
+
+            new_keys = _band_hashes(np.asarray(self._records['sig'][first:count]))
+            for offset, keys in enumerate(new_keys):
+                row = first + offset
+                for band, key in enumerate(keys.tolist()):
+                    tail[band].setdefault(key, []).append(row)
+            self._count = count
+
+        if self._count - self._sorted_count > TAIL_MERGE_ROWS:
+            self._start_rebuild()
+
+    def _load_bands(self):
+        try:
+            st = os.stat(_bands_path(self.path))
+        except FileNotFoundError:
+            return
+        if (st.st_ino, st.st_mtime_ns, st.st_size) == self._bands_stamp:
+            return
+
+        loaded = _load_band_tables(self.path)
+        if loaded is None:
+            return
+        count, keys, rows, self._bands_stamp = loaded
+        if count <= self._sorted_count:
+            return
+
+        self._sorted_keys, self._sorted_rows, self._sorted_count = keys, rows, count
+        # Tails the tables now cover are dropped (a partly covered one only
+        # yields candidates twice)
+        if self._count <= count:
+            self._tails = []
+        while len(self._tails) > 1 and self._tails[1][0] <= count:
+            self._tails.pop(0)
+
+    def _start_rebuild(self):
+        if self._rebuilding or time.monotonic() < self._next_rebuild:
+            return
+        self._rebuilding = True
+        # Later rows start a new tail, the only one left once the tables land
+        self._tails.append((self._count, [{} for _ in range(BANDS)]))
+        threading.Thread(target=self._rebuild, args=(self._records, self._count),
+                         name='similarity-rebuild', daemon=True).start()
+
+    def _rebuild(self, records, count):
+        started = time.perf_counter()
+        try:
+            built = build_band_tables(self.path, records, count, blocking=False)
+            if built:
+                print(f"✓ Similarity band tables rebuilt for {count} rows "
+                      f"in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            print(f"❌ Similarity band rebuild failed: {e}")
+            built = False
+
+        with self._lock:
+            self._rebuilding = False
+            if not built:
+                self._next_rebuild = time.monotonic() + REBUILD_RETRY
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+
+    def add(self, analysis_id, text, trust_score, risk_level):
+        self.add_many([(analysis_id, text, trust_score, risk_level)])
+
+    def add_many(self, entries):
+        """Append (analysis_id, text, trust_score, risk_level) tuples"""
+        records = np.zeros(len(entries), dtype=RECORD)
+        for i, (analysis_id, text, trust_score, risk_level) in enumerate(entries):
+            records[i]['analysis_id'] = np.frombuffer(bytes.fromhex(str(analysis_id)), dtype=np.uint8)
+            records[i]['trust_score'] = int(trust_score)
+            records[i]['risk'] = RISK_CODES.get(risk_level, 2)
+            records[i]['sig'] = signature(text)
+
+        # Rows go right after the committed ones and the count is raised
+        # last, under an exclusive lock: readers never map a partial record,
+        # and one cut short by a crash is overwritten by the next write
+        with open(self.path, 'r+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(COUNT_OFFSET)
+                count = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+                f.seek(HEADER.itemsize + count * RECORD.itemsize)
+                f.write(records.tobytes())
+                f.flush()
+                f.seek(COUNT_OFFSET)
+                f.write(np.array([count + len(records)], dtype='<u4').tobytes())
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def rows(self):
+        """Read-only view of every committed record"""
+        with self._lock:
+            self._refresh()
+            return self._records
+
+    def build_bands(self):
+        """Rebuild the band tables for every row now, waiting for a running build"""
+        with self._lock:
+            self._refresh()
+            records, count = self._records, self._count
+        build_band_tables(self.path, records, count)
+        with self._lock:
+            self._refresh()
+        return count
+
+    def query(self, text, top_k=SIMILARITY_TOP_K, threshold=SIMILARITY_THRESHOLD):
+        sig = signature(text)
+        # Keys stay uint64 arrays: a Python int would make searchsorted
+        # convert the whole sorted table on every call
+        keys = _band_hashes(sig[np.newaxis, :])[0]
+
+        with self._lock:
+            self._refresh()
+            candidates = set()
+            for band in range(BANDS):
+                key = keys[band:band + 1]
+                sorted_keys = self._sorted_keys[band]
+                lo = sorted_keys.searchsorted(key, side='left')[0]
+                hi = sorted_keys.searchsorted(key, side='right')[0]
+                candidates.update(self._sorted_rows[band][max(lo, hi - MAX_BUCKET_CANDIDATES):hi].tolist())
+                for _, tail in self._tails:
+                    candidates.update(tail[band].get(int(key[0]), [])[-MAX_BUCKET_CANDIDATES:])
+            if not candidates:
+                return []
+
+            rows = np.fromiter(candidates, dtype=np.int64)
+            matches = self._records[rows]
+
+        scores = (np.asarray(matches['sig']) == sig).mean(axis=1)
+        best = np.argsort(-scores, kind='stable')[:top_k]
+
+        return [
+            {
+                'analysis_id': matches[i]['analysis_id'].tobytes().hex(),
+                'similarity': round(float(scores[i]), 3),
+                'risk_level': RISK_NAMES[int(matches[i]['risk'])],
+                'trust_score': int(matches[i]['trust_score'])
+            }
+            for i in best if scores[i] >= threshold
+        ]
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Process-wide index; forked workers open their own (and rebuild thread)"""
+    global _index, _index_pid
+
+    with _index_lock:
+        if _index is None or _index_pid != os.getpid():
+            _index = SimilarityIndex(SIMILARITY_INDEX_PATH)
+            _index_pid = os.getpid()
+        return _index
+
+
+def find_similar_offers(text):
+    """Closest previously analysed offers; [] when disabled or on error"""
+    if not SIMILARITY_ENABLED:
+        return []
+    try:
+        return get_similarity_index().query(text)
+    except Exception as e:
+        print(f"❌ Similarity lookup failed: {e}")
+        return []
+
+
+def index_analysis(analysis_id, text, result):
+    """Add a stored analysis to the index so later offers can match it"""
+    if not SIMILARITY_ENABLED:
+        return
+    try:
+        get_similarity_index().add(analysis_id, text, result['trust_score'], result['risk_level'])
+    except Exception as e:
+        print(f"❌ Similarity index update failed: {e}")
@@ -0,0 +1,155 @@
+"""
+Website Verification
+DNS reachability checks for company websites with a shared TTL cache,
+a strict per-lookup deadline and one in-flight lookup per domain.
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+DNS_TIMEOUT = float(os.getenv('DNS_TIMEOUT', 2.0))
+DNS_CACHE_TTL = float(os.getenv('DNS_CACHE_TTL', 3600))
+DNS_NEGATIVE_TTL = float(os.getenv('DNS_NEGATIVE_TTL', 300))
+DNS_CACHE_SIZE = int(os.getenv('DNS_CACHE_SIZE', 10000))
+DNS_WORKERS = int(os.getenv('DNS_WORKERS', 8))
+
+REACHABLE = (True, "Website reachable")
+NOT_REACHABLE = (False, "Website not reachable")
+TIMED_OUT = (False, "Website lookup timed out")
+
+
+def website_domain(url):
+    parsed = urlparse(url if url.startswith('http') else 'https://' + url)
+    return parsed.netloc.lower()
+
+
+# -----------------------------
+# VERIFIER
+# -----------------------------
+
+class PendingCheck:
+    """Handle for a lookup started with WebsiteVerifier.check()"""
+
+    def __init__(self, verifier, future=None, result=None, deadline=None):
+        self._verifier = verifier
+        self._future = future
+        self._result = result
+        self._deadline = deadline
+
+    def result(self):
+        """Wait for the lookup, but never past its deadline"""
+        if self._future is None:
+            return self._result
+
+        remaining = max(0.0, self._deadline - time.monotonic())
+        try:
+            ok = self._future.result(timeout=remaining)
+        except FutureTimeout:
+            self._verifier._count('timeouts')
+            return TIMED_OUT
+        return REACHABLE if ok else NOT_REACHABLE
+
+
+class WebsiteVerifier:
+    """
+    Resolves website domains on a small thread pool.
+
+    Both positive and negative answers are cached (with separate TTLs), and
+    concurrent checks of the same domain share a single lookup. A lookup
+    that outlives its deadline keeps running in the background and fills
+    the cache for later requests.
+    """
+
+    def __init__(self, timeout=DNS_TIMEOUT, ttl=DNS_CACHE_TTL, negative_ttl=DNS_NEGATIVE_TTL,
+                 max_entries=DNS_CACHE_SIZE, workers=DNS_WORKERS, resolver=socket.gethostbyname):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._resolver = resolver
+
+        self._cache = OrderedDict()     # domain -> (expires_at, ok)
+        self._pending = {}              # domain -> Future
+        # Re-entrant: a lookup that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dns')
+        self.stats = {'hits': 0, 'misses': 0, 'joined': 0, 'timeouts': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _resolve(self, domain):
+        try:
+            self._resolver(domain)
+            return True
+        except Exception:
+            return False
+
+    def _store(self, domain, future):
+        ok = not future.cancelled() and future.exception() is None and future.result()
+        expires = time.monotonic() + (self.ttl if ok else self.negative_ttl)
+
+        with self._lock:
+            self._pending.pop(domain, None)
+            self._cache[domain] = (expires, ok)
+            self._cache.move_to_end(domain)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def check(self, url):
+        """Start (or join) the lookup for a URL and return a PendingCheck"""
+        try:
+            domain = website_domain(url)
+        except Exception:
+            return PendingCheck(self, result=NOT_REACHABLE)
+
+        with self._lock:
+            cached = self._cache.get(domain)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(domain)
+                self.stats['hits'] += 1
+                return PendingCheck(self, result=REACHABLE if cached[1] else NOT_REACHABLE)
+
+            future = self._pending.get(domain)
+            if future is not None:
+                self.stats['joined'] += 1
+            else:
+                self.stats['misses'] += 1
+                future = self._executor.submit(self._resolve, domain)
+                self._pending[domain] = future
+                future.add_done_callback(lambda f, d=domain: self._store(d, f))
+
+        return PendingCheck(self, future=future, deadline=time.monotonic() + self.timeout)
+
+    def verify(self, url):
+        return self.check(url).result()
+
+
+# -----------------------------
+# SHARED INSTANCE
+# -----------------------------
+
+_verifier = None
+_verifier_pid = None
+_verifier_lock = threading.Lock()
+
+
+def get_verifier():
+    """Process-wide verifier; rebuilt after fork so worker threads are valid"""
+    global _verifier, _verifier_pid
+
+    with _verifier_lock:
+        if _verifier is None or _verifier_pid != os.getpid():
+            _verifier = WebsiteVerifier()
+            _verifier_pid = os.getpid()
+        return _verifier
@@ -0,0 +1,275 @@
+"""
+Upload Storage Lifecycle
+Uploads are stored once per content hash (see save_uploaded_file) and
+reference-counted from `uploaded_files`. Per-user quotas cap what a user
+keeps stored, and a background sweeper expires old upload records and
+deletes unreferenced blobs and stray files in batches.
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.database import get_files_collection, get_blobs_collection
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+
+# Stored bytes and files each user may keep (0 disables a limit)
+UPLOAD_QUOTA_MB = float(os.getenv('UPLOAD_QUOTA_MB', 200))
+UPLOAD_QUOTA_FILES = int(os.getenv('UPLOAD_QUOTA_FILES', 500))
+
+# Upload records older than this are expired and release their blob
+UPLOAD_RETENTION_DAYS = float(os.getenv('UPLOAD_RETENTION_DAYS', 30))
+
+# Unreferenced blobs and stray files are kept this long before deletion
+UPLOAD_ORPHAN_GRACE = float(os.getenv('UPLOAD_ORPHAN_GRACE', 3600))
+
+# Seconds between sweeps (0 disables the sweeper) and items per batch
+UPLOAD_SWEEP_INTERVAL = float(os.getenv('UPLOAD_SWEEP_INTERVAL', 600))
+UPLOAD_SWEEP_BATCH = int(os.getenv('UPLOAD_SWEEP_BATCH', 500))
+
+_BLOB_NAME = re.compile(r'^([0-9a-f]{64})\.\w+$')
+
+_lock = threading.Lock()
+_stats = {'sweeps': 0, 'records_expired': 0, 'blobs_deleted': 0, 'files_deleted': 0,
+          'bytes_reclaimed': 0, 'last_sweep': None}
+
+
+class QuotaExceeded(Exception):
+    """The user already stores as much as UPLOAD_QUOTA_* allows"""
+
+
+# -----------------------------
+# QUOTAS
+# -----------------------------
+
+def upload_usage(user_id):
+    """{'bytes', 'files'} currently stored for the user"""
+    usage = list(get_files_collection().aggregate([
+        {'$match': {'user_id': user_id}},
+        {'$group': {'_id': None, 'bytes': {'$sum': '$size'}, 'files': {'$sum': 1}}}
+    ]))
+    if not usage:
+        return {'bytes': 0, 'files': 0}
+    return {'bytes': usage[0]['bytes'], 'files': usage[0]['files']}
+
+
+def check_upload_quota(user_id, incoming_bytes=0):
+    """Raise QuotaExceeded if one more upload of incoming_bytes won't fit"""
+    if not UPLOAD_QUOTA_MB and not UPLOAD_QUOTA_FILES:
+        return
+
+    usage = upload_usage(user_id)
+    if UPLOAD_QUOTA_FILES and usage['files'] + 1 > UPLOAD_QUOTA_FILES:
+        raise QuotaExceeded(f"Upload limit reached ({UPLOAD_QUOTA_FILES} files)")
+    if UPLOAD_QUOTA_MB and usage['bytes'] + (incoming_bytes or 0) > UPLOAD_QUOTA_MB * (1 << 20):
+        raise QuotaExceeded(f"Upload storage limit reached ({UPLOAD_QUOTA_MB:g} MB)")
+
+
+# -----------------------------
+# REFERENCE COUNTS
+# -----------------------------
+
+def claim_blob(content_hash, file_path, size):
+    """
+    Take a reference on a blob before its file is committed. A blob the
+    sweeper is deleting can't be claimed (the upsert collides on _id), so
+    the claim waits until the deletion is finished and starts a new blob.
+    """
+    blobs = get_blobs_collection()
+    for _ in range(50):
+        try:
+            blobs.update_one(
+                {'_id': content_hash, 'deleting': {'$ne': True}},
+                {
+                    '$inc': {'refs': 1},
+                    '$set': {'last_ref_at': datetime.utcnow()},
+                    '$unset': {'orphaned_at': ''},
+                    '$setOnInsert': {'path': file_path, 'size': size, 'created_at': datetime.utcnow()}
+                },
+                upsert=True
+            )
+            return
+        except DuplicateKeyError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Blob {content_hash} is stuck in deletion")
+
+
+def release_blob(content_hash, count=1):
+    blobs = get_blobs_collection()
+    doc = blobs.find_one_and_update(
+        {'_id': content_hash, 'refs': {'$gt': 0}},
+        {'$inc': {'refs': -count}},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is not None and doc['refs'] <= 0:
+        # Grace period starts now; the sweeper deletes it later
+        blobs.update_one({'_id': content_hash, 'refs': {'$lte': 0}},
+                         {'$set': {'orphaned_at': datetime.utcnow()}})
+
+
+def release_upload(analysis_id, user_id):
+    """Drop the upload record behind a deleted analysis and its blob reference"""
+    record = get_files_collection().find_one_and_delete(
+        {'analysis_id': analysis_id, 'user_id': user_id}
+    )
+    if record and record.get('content_hash'):
+        release_blob(record['content_hash'])
+
+
+# -----------------------------
+# SWEEPER
+# -----------------------------
+
+def _expire_records():
+    files = get_files_collection()
+    cutoff = datetime.utcnow() - timedelta(days=UPLOAD_RETENTION_DAYS)
+    expired = 0
+
+    while True:
+        batch = list(files.find({'uploaded_at': {'$lt': cutoff}}, {'content_hash': 1})
+                     .limit(UPLOAD_SWEEP_BATCH))
+        if not batch:
+            return expired
+        files.delete_many({'_id': {'$in': [r['_id'] for r in batch]}})
+        expired += len(batch)
+
+        released = {}
+        for record in batch:
+            if record.get('content_hash'):
+                released[record['content_hash']] = released.get(record['content_hash'], 0) + 1
+        for content_hash, count in released.items():
+            release_blob(content_hash, count)
+
+
+def _remove(path):
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except OSError:
+        return None
+
+
+def _delete_orphaned_blobs():
+    blobs = get_blobs_collection()
+    cutoff = datetime.utcnow() - timedelta(seconds=UPLOAD_ORPHAN_GRACE)
+    deleted, reclaimed = 0, 0
+
+    while True:
+        batch = list(blobs.find({'refs': {'$lte': 0}, 'orphaned_at': {'$lte': cutoff},
+                                 'deleting': {'$ne': True}}).limit(UPLOAD_SWEEP_BATCH))
+        if not batch:
+            return deleted, reclaimed
+
+        for blob in batch:
+            # Claims can't touch a blob marked as deleting (see claim_blob)
+            marked = blobs.update_one(
+                {'_id': blob['_id'], 'refs': {'$lte': 0}, 'deleting': {'$ne': True}},
+                {'$set': {'deleting': True}}
+            )
+            if not marked.modified_count:
+                continue
+            size = _remove(blob['path'])
+            blobs.delete_one({'_id': blob['_id'], 'deleting': True})
+            deleted += 1
+            reclaimed += size or 0
+
+
+def _delete_stray_files(upload_dir):
+    """Content files without a blob record and abandoned partial uploads"""
+    if not os.path.isdir(upload_dir):
+        return 0, 0
+
+    blobs = get_blobs_collection()
+    cutoff = time.time() - UPLOAD_ORPHAN_GRACE
+    deleted, reclaimed, candidates = 0, 0, []
+
+    for root, _, names in os.walk(upload_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            match = _BLOB_NAME.match(name)
+            if not match and not name.startswith('.partial-'):
+                continue    # pre-content-addressing uploads are left alone
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            candidates.append((path, match.group(1) if match else None))
+
+    for i in range(0, len(candidates), UPLOAD_SWEEP_BATCH):
+        batch = candidates[i:i + UPLOAD_SWEEP_BATCH]
+        hashes = [h for _, h in batch if h]
+        known = {doc['_id'] for doc in blobs.find({'_id': {'$in': hashes}}, {'_id': 1})}
+        for path, content_hash in batch:
+            if content_hash in known:
+                continue
+            size = _remove(path)
+            if size is not None:
+                deleted += 1
+                reclaimed += size
+
+    return deleted, reclaimed
+
+
+def sweep_uploads(upload_dir):
+    """One sweep; returns what was expired, deleted and reclaimed"""
+    records = _expire_records()
+    blobs, blob_bytes = _delete_orphaned_blobs()
+    files, file_bytes = _delete_stray_files(upload_dir)
+
+    report = {
+        'records_expired': records,
+        'blobs_deleted': blobs,
+        'files_deleted': files,
+        'bytes_reclaimed': blob_bytes + file_bytes
+    }
+    with _lock:
+        for key, value in report.items():
+            _stats[key] += value
+        _stats['sweeps'] += 1
+        _stats['last_sweep'] = datetime.utcnow().isoformat()
+
+    if records or blobs or files:
+        print(f"🧹 Upload sweep: {records} records expired, {blobs} blobs and {files} stray files "
+              f"deleted, {report['bytes_reclaimed'] / (1 << 20):.1f} MB reclaimed")
+    return report
+
+
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+
+def _sweeper(upload_dir):
+    while True:
+        time.sleep(UPLOAD_SWEEP_INTERVAL)
+        try:
+            sweep_uploads(upload_dir)
+        except Exception as e:
+            print(f"❌ Upload sweep failed: {e}")
+
+
+def ensure_upload_sweeper(upload_dir):
+    """Start the sweeper thread once per process (forked workers included)"""
+    global _sweeper_pid
+
+    if UPLOAD_SWEEP_INTERVAL <= 0:
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        _sweeper_pid = os.getpid()
+        threading.Thread(target=_sweeper, args=(upload_dir,), name='upload-sweeper', daemon=True).start()
+
+
+def upload_store_stats():
+    with _lock:
+        return dict(_stats)
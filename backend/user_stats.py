@@ -0,0 +1,225 @@
+"""
+Per-user Statistics
+Counters kept in `user_stats` (one document per user) and updated
+atomically whenever analyses are saved or deleted, so the dashboard reads
+one small document instead of scanning every analysis a user has made.
+
+Updates never create the document: a user without one has it built from
+their analyses by a background thread, once the analyses being counted
+have been written. Every
+update bumps `version`, and a rebuild only replaces the version it read,
+so it can't overwrite updates made while it was counting.
+"""
+
+import os
+import queue
+import threading
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from backend.database import get_analyses_collection, get_user_stats_collection, wait_written
+
+# Recent analyses kept on the stats document for the dashboard summary
+RECENT_ANALYSES = int(os.getenv('RECENT_ANALYSES', 5))
+
+# Times a rebuild recounts when the counters change underneath it
+REBUILD_ATTEMPTS = 3
+
+RISK_LEVELS = ('Safe', 'Suspicious', 'High Risk')
+
+# Users waiting for a background rebuild -> ids of the analyses it must see
+_pending_rebuilds = {}
+_rebuilds = None
+_rebuilds_pid = None
+_rebuilds_lock = threading.Lock()
+
+
+def _recent_entry(record):
+    return {
+        'analysis_id': record['_id'],
+        'risk_level': record.get('risk_level'),
+        'trust_score': record.get('trust_score'),
+        'explanations': (record.get('explanations') or [])[:3],
+        'created_at': record['created_at']
+    }
+
+
+def _empty_stats(user_id):
+    return {
+        '_id': user_id,
+        'total': 0,
+        'trust_sum': 0,
+        'counts': {level: 0 for level in RISK_LEVELS},
+        'recent': []
+    }
+
+
+# -----------------------------
+# UPDATES
+# -----------------------------
+
+def record_analyses(user_id, records):
+    """Count newly saved analyses (one atomic update for the whole list)"""
+    if not records:
+        return
+
+    inc = {'total': len(records), 'trust_sum': 0, 'version': 1}
+    for record in records:
+        inc['trust_sum'] += record.get('trust_score', 0)
+        key = f"counts.{record.get('risk_level')}"
+        inc[key] = inc.get(key, 0) + 1
+
+    result = get_user_stats_collection().update_one(
+        {'_id': user_id},
+        {
+            '$inc': inc,
+            '$push': {'recent': {
+                '$each': [_recent_entry(r) for r in records],
+                '$sort': {'created_at': -1},
+                '$slice': RECENT_ANALYSES
+            }},
+            '$set': {'updated_at': datetime.utcnow()}
+        }
+    )
+    if result.matched_count == 0:
+        # No counters yet: count these from the database once they're in it
+        _queue_rebuild(user_id, [record['_id'] for record in records])
+
+
+def record_analysis(user_id, record):
+    record_analyses(user_id, [record])
+
+
+def _queue_rebuild(user_id, record_ids):
+    """Build a user's counters off the request, after record_ids are written"""
+    global _rebuilds, _rebuilds_pid
+
+    with _rebuilds_lock:
+        if _rebuilds is None or _rebuilds_pid != os.getpid():
+            _pending_rebuilds.clear()
+            _rebuilds = queue.Queue()
+            _rebuilds_pid = os.getpid()
+            threading.Thread(target=_rebuild_worker, name='stats-rebuild', daemon=True).start()
+
+        queued = user_id in _pending_rebuilds
+        _pending_rebuilds.setdefault(user_id, []).extend(record_ids)
+        if not queued:
+            _rebuilds.put(user_id)
+
+
+def _rebuild_worker():
+    while True:
+        user_id = _rebuilds.get()
+        try:
+            # Analyses saved after this point queue another rebuild
+            with _rebuilds_lock:
+                record_ids = _pending_rebuilds.pop(user_id, [])
+            for record_id in record_ids:
+                wait_written(record_id)
+            rebuild_user_stats(user_id)
+        except Exception as e:
+            print(f"❌ Failed to build counters for {user_id}: {e}")
+        finally:
+            _rebuilds.task_done()
+
+
+def remove_analysis(user_id, record):
+    """Uncount a deleted analysis (`record` is the deleted document)"""
+    stats = get_user_stats_collection()
+    updated = stats.find_one_and_update(
+        {'_id': user_id},
+        {
+            '$inc': {
+                'total': -1,
+                'version': 1,
+                'trust_sum': -record.get('trust_score', 0),
+                f"counts.{record.get('risk_level')}": -1
+            },
+            '$pull': {'recent': {'analysis_id': record['_id']}},
+            '$set': {'updated_at': datetime.utcnow()}
+        },
+        projection={'recent': 1, 'total': 1}
+    )
+
+    # The removed one was on the recent list: refill it from the analyses
+    if updated and any(r['analysis_id'] == record['_id'] for r in updated.get('recent', [])):
+        stats.update_one({'_id': user_id}, {'$set': {'recent': _load_recent(user_id)}})
+
+
+# -----------------------------
+# READS / BACKFILL
+# -----------------------------
+
+def _load_recent(user_id):
+    cursor = get_analyses_collection().find(
+        {'user_id': user_id},
+        {'risk_level': 1, 'trust_score': 1, 'explanations': 1, 'created_at': 1}
+    ).sort([('created_at', -1), ('_id', -1)]).limit(RECENT_ANALYSES)
+    return [_recent_entry(r) for r in cursor]
+
+
+def _count_analyses(user_id):
+    stats = _empty_stats(user_id)
+    grouped = get_analyses_collection().aggregate([
+        {'$match': {'user_id': user_id}},
+        {'$group': {
+            '_id': '$risk_level',
+            'count': {'$sum': 1},
+            'trust_sum': {'$sum': {'$ifNull': ['$trust_score', 0]}}
+        }}
+    ])
+    for group in grouped:
+        stats['total'] += group['count']
+        stats['trust_sum'] += group['trust_sum']
+        stats['counts'][group['_id']] = stats['counts'].get(group['_id'], 0) + group['count']
+
+    stats['recent'] = _load_recent(user_id)
+    stats['updated_at'] = datetime.utcnow()
+    return stats
+
+
+def rebuild_user_stats(user_id):
+    """
+    Recompute one user's counters from their analyses and store them,
+    unless the counters were updated while counting (then count again).
+    """
+    collection = get_user_stats_collection()
+    stats = None
+    for _ in range(REBUILD_ATTEMPTS):
+        current = collection.find_one({'_id': user_id}, {'version': 1})
+        stats = _count_analyses(user_id)
+
+        if current is None:
+            stats['version'] = 0
+            try:
+                collection.insert_one(stats)
+                return stats
+            except DuplicateKeyError:
+                continue    # built concurrently; recount against that one
+
+        version = current.get('version')
+        stats['version'] = (version or 0) + 1
+        if collection.replace_one({'_id': user_id, 'version': version}, stats).matched_count:
+            return stats
+
+    # Busy user: the live counters are kept as they are
+    print(f"✗ Counters for {user_id} kept changing, not rebuilt")
+    return collection.find_one({'_id': user_id}) or stats
+
+
+def get_user_stats(user_id):
+    """The user's counters; built on first read for users not backfilled yet"""
+    stats = get_user_stats_collection().find_one({'_id': user_id})
+    if stats is None:
+        stats = rebuild_user_stats(user_id)
+    return stats
+
+
+def backfill_user_stats():
+    """Build counters for every user with analyses; returns users processed"""
+    users = 0
+    for user_id in get_analyses_collection().distinct('user_id'):
+        rebuild_user_stats(user_id)
+        users += 1
+    return users
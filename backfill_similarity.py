@@ -0,0 +1,75 @@
+"""
+Similarity Index Backfill
+One-off job that adds stored analyses to the near-duplicate index
+(`SIMILARITY_INDEX_PATH`), e.g. ones saved before the index existed or
+while it was disabled, then builds its band tables so workers don't have
+to. Safe to re-run; analyses already in the index are skipped, and so are
+texts whose signature is already in it (repeats of the same offer).
+
+The stored text is what gets indexed, which is the first 1000 characters
+of each offer.
+
+Usage:
+    python backfill_similarity.py
+    python backfill_similarity.py --batch 5000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from backend.database import init_db, get_analyses_collection
+from backend.similarity import get_similarity_index, signature
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index stored analyses for near-duplicate detection")
+    parser.add_argument('--batch', type=int, default=2000, help="analyses appended per write")
+    args = parser.parse_args()
+
+    init_db()
+    index = get_similarity_index()
+    started = time.perf_counter()
+
+    records = index.rows()
+    indexed = {row.tobytes() for row in np.asarray(records['analysis_id'])}
+    # Repeats of one offer share a signature; one copy is enough to match
+    seen = {hash(row.tobytes()) for row in np.asarray(records['sig'])}
+    del records
+    batch, added, skipped = [], 0, 0
+
+    cursor = get_analyses_collection().find(
+        {}, {'text': 1, 'trust_score': 1, 'risk_level': 1}
+    ).sort('_id', 1)
+
+    for doc in cursor:
+        text = doc.get('text') or ''
+        if doc['_id'].binary in indexed or not text.strip():
+            skipped += 1
+            continue
+        digest = hash(signature(text).tobytes())
+        if digest in seen:
+            skipped += 1
+            continue
+        seen.add(digest)
+        batch.append((doc['_id'], text, doc.get('trust_score', 0), doc.get('risk_level')))
+
+        if len(batch) == args.batch:
+            index.add_many(batch)
+            added += len(batch)
+            batch = []
+            print(f"\rIndexed {added}", end='', flush=True)
+    if batch:
+        index.add_many(batch)
+        added += len(batch)
+
+    print(f"\r✓ Indexed {added} analyses ({skipped} skipped) in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    rows = index.build_bands()
+    print(f"✓ Built band tables for {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
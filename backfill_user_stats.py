@@ -0,0 +1,36 @@
+"""
+User Statistics Backfill
+One-off job that builds the per-user dashboard counters (`user_stats`)
+from existing analyses. Safe to re-run; each user's document is rebuilt
+from scratch.
+
+Usage:
+    python backfill_user_stats.py
+    python backfill_user_stats.py --user <user_id>
+"""
+
+import argparse
+import time
+
+from backend.database import init_db
+from backend.user_stats import backfill_user_stats, rebuild_user_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-user dashboard counters")
+    parser.add_argument('--user', help="rebuild a single user's counters")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+
+    if args.user:
+        stats = rebuild_user_stats(args.user)
+        print(f"✓ Rebuilt counters for {args.user}: {stats['total']} analyses")
+    else:
+        users = backfill_user_stats()
+        print(f"✓ Rebuilt counters for {users} users in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Dashboard Query Benchmark
+Seeds a throwaway database with synthetic analyses and times the dashboard
+queries the way they used to run (created_at index only, skip paging,
+full documents, per-request counting) against the current ones (compound
+(user_id, created_at, _id) index, keyset paging, list projection, $group
+aggregation and the per-user counters).
+
+Usage:
+    python benchmark_dashboard.py
+    python benchmark_dashboard.py --analyses 1000000 --users 1000 --pages 200
+    python benchmark_dashboard.py --reuse     # keep the seeded data between runs
+
+Uses MONGODB_URI and writes to `<DATABASE_NAME>_bench`, which is dropped
+first unless --reuse is given.
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from backend import dashboard
+from backend.user_stats import RISK_LEVELS
+
+load_dotenv()
+
+LEGACY_INDEX = 'created_at_1'
+SEED_BATCH = 10000
+
+
+# -----------------------------
+# SEEDING
+# -----------------------------
+
+def _analysis(user_id, created_at, text):
+    risk = random.choice(RISK_LEVELS)
+    return {
+        '_id': ObjectId(),
+        'user_id': user_id,
+        'text': text,
+        'risk_level': risk,
+        'trust_score': random.randint(0, 100),
+        'explanations': [f"{risk} signal {i}" for i in range(5)],
+        'ai_explanation': text[:600],
+        'ai_status': 'done',
+        'rule_pack_version': 'bench',
+        'created_at': created_at
+    }
+
+
+def seed(db, analyses, users, heavy_share, text_size):
+    """One heavy user (the one that gets benchmarked) plus background users"""
+    collection = db.analyses
+    collection.create_index('created_at')
+    collection.create_index([('user_id', 1), ('created_at', -1), ('_id', -1)])
+
+    text = 'x' * text_size
+    heavy = int(analyses * heavy_share)
+    start = datetime.utcnow() - timedelta(days=365)
+    batch, started = [], time.perf_counter()
+
+    for i in range(analyses):
+        user_id = 'bench-heavy' if i < heavy else f'bench-{random.randrange(users)}'
+        created_at = start + timedelta(seconds=random.randrange(365 * 24 * 3600))
+        batch.append(_analysis(user_id, created_at, text))
+        if len(batch) == SEED_BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+            print(f"\rSeeded {i + 1}/{analyses}", end='', flush=True)
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+    print(f"\rSeeded {analyses} analyses in {time.perf_counter() - started:.0f}s")
+    return heavy
+
+
+def seed_counters(db, user_id):
+    """The user_stats document the app keeps for the benchmarked user"""
+    stats = {'_id': user_id, 'total': 0, 'trust_sum': 0, 'counts': {}}
+    for group in db.analyses.aggregate(_group_pipeline(user_id)):
+        stats['total'] += group['count']
+        stats['trust_sum'] += group['trust_sum']
+        stats['counts'][group['_id']] = group['count']
+    db.user_stats.replace_one({'_id': user_id}, stats, upsert=True)
+
+
+# -----------------------------
+# QUERIES
+# -----------------------------
+
+def _group_pipeline(user_id):
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$group': {'_id': '$risk_level', 'count': {'$sum': 1}, 'trust_sum': {'$sum': '$trust_score'}}}
+    ]
+
+
+def legacy_page(db, user_id, page, limit):
+    cursor = db.analyses.find({'user_id': user_id}).sort('created_at', -1) \
+        .hint(LEGACY_INDEX).skip(page * limit).limit(limit)
+    return list(cursor)
+
+
+def legacy_total(db, user_id):
+    return db.analyses.count_documents({'user_id': user_id}, hint=LEGACY_INDEX)
+
+
+def legacy_stats(db, user_id):
+    """Every analysis pulled to the app and summed there"""
+    counts, trust_sum = {}, 0
+    for doc in db.analyses.find({'user_id': user_id}, {'risk_level': 1, 'trust_score': 1}).hint(LEGACY_INDEX):
+        counts[doc['risk_level']] = counts.get(doc['risk_level'], 0) + 1
+        trust_sum += doc['trust_score']
+    return counts, trust_sum
+
+
+def keyset_page(db, user_id, after, limit):
+    query = {'user_id': user_id}
+    if after:
+        query.update(dashboard._after_cursor(after))
+    rows = list(db.analyses.find(query, dashboard.LIST_FIELDS)
+                .sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+    return rows[:limit], dashboard._page_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+
+def group_stats(db, user_id):
+    return list(db.analyses.aggregate(_group_pipeline(user_id)))
+
+
+def counter_stats(db, user_id):
+    return db.user_stats.find_one({'_id': user_id})
+
+
+# -----------------------------
+# TIMING
+# -----------------------------
+
+def _timed(fn, *args, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _examined(cursor):
+    stats = cursor.explain().get('executionStats', {})
+    return stats.get('totalKeysExamined'), stats.get('totalDocsExamined')
+
+
+def run(db, user_id, pages, limit, repeat):
+    rows = []
+
+    # Walking the list page by page: skip re-reads everything before the page
+    legacy_first, _ = _timed(legacy_page, db, user_id, 0, limit, repeat=repeat)
+    legacy_last, _ = _timed(legacy_page, db, user_id, pages - 1, limit, repeat=repeat)
+    rows.append(('page 1 (skip, full docs)', legacy_first))
+    rows.append((f'page {pages} (skip, full docs)', legacy_last))
+
+    after, keyset_first, keyset_last = None, None, None
+    for page in range(pages):
+        elapsed, (_, next_after) = _timed(keyset_page, db, user_id, after, limit, repeat=1)
+        if page == 0:
+            keyset_first = elapsed
+        keyset_last = elapsed
+        if next_after is None:
+            break
+        after = next_after
+    rows.append(('page 1 (keyset, projection)', keyset_first))
+    rows.append((f'page {page + 1} (keyset, projection)', keyset_last))
+
+    rows.append(('total (count_documents)', _timed(legacy_total, db, user_id, repeat=repeat)[0]))
+    rows.append(('stats (scan in app)', _timed(legacy_stats, db, user_id, repeat=repeat)[0]))
+    rows.append(('stats ($group)', _timed(group_stats, db, user_id, repeat=repeat)[0]))
+    rows.append(('stats/total (counters)', _timed(counter_stats, db, user_id, repeat=repeat)[0]))
+
+    legacy_scan = _examined(db.analyses.find({'user_id': user_id}).sort('created_at', -1)
+                            .hint(LEGACY_INDEX).skip((pages - 1) * limit).limit(limit))
+    keyset_scan = _examined(db.analyses.find({'user_id': user_id}, dashboard.LIST_FIELDS)
+                            .sort([('created_at', -1), ('_id', -1)]).limit(limit))
+    return rows, legacy_scan, keyset_scan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard queries")
+    parser.add_argument('--analyses', type=int, default=1000000, help="analyses to seed")
+    parser.add_argument('--users', type=int, default=1000, help="background users")
+    parser.add_argument('--heavy-share', type=float, default=0.05,
+                        help="share of analyses owned by the benchmarked user")
+    parser.add_argument('--text-size', type=int, default=1000, help="stored text length per analysis")
+    parser.add_argument('--pages', type=int, default=100, help="pages to walk")
+    parser.add_argument('--limit', type=int, default=50, help="page size")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per query (best is kept)")
+    parser.add_argument('--reuse', action='store_true', help="reuse previously seeded data")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGODB_URI'))
+    db = client[os.getenv('DATABASE_NAME', 'job_scam_detector') + '_bench']
+
+    if not args.reuse or db.analyses.estimated_document_count() == 0:
+        client.drop_database(db.name)
+        seed(db, args.analyses, args.users, args.heavy_share, args.text_size)
+        seed_counters(db, 'bench-heavy')
+
+    total = db.analyses.estimated_document_count()
+    owned = db.user_stats.find_one({'_id': 'bench-heavy'})['total']
+    print(f"{total} analyses, {owned} owned by the benchmarked user, page size {args.limit}")
+
+    rows, legacy_scan, keyset_scan = run(db, 'bench-heavy', args.pages, args.limit, args.repeat)
+    print(f"{'query':<36} {'ms':>9}")
+    for name, elapsed in rows:
+        print(f"{name:<36} {elapsed:>9.1f}")
+    print(f"page {args.pages} with skip examined {legacy_scan[0]} keys / {legacy_scan[1]} docs; "
+          f"a keyset page examines {keyset_scan[0]} keys / {keyset_scan[1]} docs")
+
+
+if __name__ == '__main__':
+    main()
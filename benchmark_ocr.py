@@ -0,0 +1,158 @@
+"""
+OCR Preprocessing Benchmark
+Compares the adaptive preprocessing in backend/ocr_utils.py with the
+previous fixed pipeline (median blur + adaptive threshold + --psm 6) and
+reports ms/page and character accuracy.
+
+Usage:
+    python benchmark_ocr.py
+    python benchmark_ocr.py --corpus screenshots/ --repeat 3
+
+Images are backend/test.png plus every PNG/JPG in --corpus. Accuracy is
+measured for images with a ground-truth transcription next to them
+(`name.txt` for `name.png`). Without a Tesseract binary only
+preprocessing time is reported.
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+
+import cv2
+import pytesseract
+
+from backend import ocr_utils
+
+DEFAULT_IMAGES = [os.path.join('backend', 'test.png')]
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.jpeg')
+
+
+# -----------------------------
+# PIPELINES
+# -----------------------------
+
+def _legacy(image_path):
+    gray, _ = ocr_utils._load(image_path)
+    gray = cv2.medianBlur(gray, 3)
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+    return thresh, ocr_utils.PSM_BLOCK
+
+
+def _adaptive(image_path):
+    return ocr_utils._prepare(image_path)
+
+
+PIPELINES = [('legacy', _legacy), ('adaptive', _adaptive)]
+
+
+# -----------------------------
+# ACCURACY
+# -----------------------------
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def _edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(text, truth):
+    """1 - character error rate, floored at 0"""
+    text, truth = _normalize(text), _normalize(truth)
+    if not truth:
+        return None
+    return max(0.0, 1 - _edit_distance(text, truth) / len(truth))
+
+
+def _truth_for(image_path):
+    path = os.path.splitext(image_path)[0] + '.txt'
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+# -----------------------------
+# BENCHMARK
+# -----------------------------
+
+def _tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def run(images, repeat, with_ocr):
+    results = {name: {'prep_ms': [], 'ocr_ms': [], 'accuracy': []} for name, _ in PIPELINES}
+
+    for image_path in images:
+        truth = _truth_for(image_path)
+        for name, pipeline in PIPELINES:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                processed, psm = pipeline(image_path)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name]['prep_ms'].append(min(timings))
+
+            if not with_ocr:
+                continue
+            config = f"{ocr_utils.TESSERACT_OEM} --psm {psm}"
+            start = time.perf_counter()
+            text = pytesseract.image_to_string(processed, lang=ocr_utils.TESSERACT_LANG, config=config)
+            results[name]['ocr_ms'].append((time.perf_counter() - start) * 1000)
+            if truth is not None:
+                results[name]['accuracy'].append(char_accuracy(text, truth))
+
+    return results
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _fmt(value, width, precision):
+    return f"{value:{width}.{precision}f}" if value is not None else f"{'-':>{width}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing")
+    parser.add_argument('--corpus', help="directory of extra images (with optional .txt ground truth)")
+    parser.add_argument('--repeat', type=int, default=5, help="preprocessing runs per image (best is kept)")
+    parser.add_argument('--no-ocr', action='store_true', help="time preprocessing only")
+    args = parser.parse_args()
+
+    images = list(DEFAULT_IMAGES)
+    if args.corpus:
+        for pattern in IMAGE_PATTERNS:
+            images.extend(sorted(glob.glob(os.path.join(args.corpus, pattern))))
+
+    with_ocr = not args.no_ocr and _tesseract_available()
+    if not args.no_ocr and not with_ocr:
+        print("Tesseract not found: reporting preprocessing time only")
+
+    results = run(images, args.repeat, with_ocr)
+
+    print(f"{len(images)} image(s)")
+    print(f"{'pipeline':<10} {'prep ms':>9} {'ocr ms':>9} {'total ms/page':>14} {'char acc':>9}")
+    for name, _ in PIPELINES:
+        prep = _mean(results[name]['prep_ms'])
+        ocr = _mean(results[name]['ocr_ms'])
+        total = prep + ocr if ocr is not None else None
+        accuracy = _mean(results[name]['accuracy'])
+        print(f"{name:<10} {_fmt(prep, 9, 1)} {_fmt(ocr, 9, 1)} {_fmt(total, 14, 1)} {_fmt(accuracy, 9, 3)}")
+
+
+if __name__ == '__main__':
+    main()
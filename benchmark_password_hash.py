@@ -0,0 +1,93 @@
+"""
+Password Hashing Benchmark
+Times one hash and one check for each hashing setting on this machine,
+and the throughput of the hashing pool under concurrent sign-ins. Use it
+to pick PASSWORD_HASH_METHOD (aim for a cost that takes roughly
+50-250 ms per hash) and PASSWORD_HASH_WORKERS.
+
+Usage:
+    python benchmark_password_hash.py
+    python benchmark_password_hash.py --methods scrypt:65536:8:1 pbkdf2:sha256:1000000 --repeat 10
+    python benchmark_password_hash.py --concurrency 64 --workers 4
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import password_hasher
+from backend.password_hasher import PasswordHasher, HashingBusy, make_hash, check_hash
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'bcrypt:10',
+    'bcrypt:12',
+]
+
+PASSWORD = 'correct horse battery staple'
+
+
+def _ms(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def time_method(method, repeat):
+    """Median ms for one hash and one check"""
+    stored = make_hash(PASSWORD, method)
+    hash_ms = statistics.median(_ms(make_hash, PASSWORD, method) for _ in range(repeat))
+    check_ms = statistics.median(_ms(check_hash, stored, PASSWORD) for _ in range(repeat))
+    return hash_ms, check_ms
+
+
+def pool_throughput(method, workers, queue_size, concurrency, logins):
+    """Checks/s through the pool with `concurrency` callers, and how many were rejected"""
+    stored = make_hash(PASSWORD, method)
+    hasher = PasswordHasher(workers=workers, queue_size=queue_size)
+    rejected = 0
+
+    def login(_):
+        try:
+            return hasher.check(stored, PASSWORD)
+        except HashingBusy:
+            return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as callers:
+        for result in callers.map(login, range(logins)):
+            rejected += result is None
+    elapsed = time.perf_counter() - started
+    return (logins - rejected) / elapsed, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password hashing settings")
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, help="settings to time")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per setting (median is kept)")
+    parser.add_argument('--workers', type=int, default=password_hasher.PASSWORD_HASH_WORKERS,
+                        help="hashing pool workers")
+    parser.add_argument('--queue', type=int, default=password_hasher.PASSWORD_HASH_QUEUE,
+                        help="hashing pool queue size")
+    parser.add_argument('--concurrency', type=int, default=32, help="simultaneous logins")
+    parser.add_argument('--logins', type=int, default=64, help="logins per pool run")
+    args = parser.parse_args()
+
+    print(f"pool: {args.workers} workers, queue {args.queue}, {args.concurrency} concurrent logins")
+    print(f"{'method':<24} {'hash ms':>9} {'check ms':>9} {'pool logins/s':>14} {'rejected':>9}")
+    for method in args.methods:
+        try:
+            hash_ms, check_ms = time_method(method, args.repeat)
+        except (RuntimeError, ValueError) as e:
+            print(f"{method:<24} skipped: {e}")
+            continue
+        rate, rejected = pool_throughput(method, args.workers, args.queue, args.concurrency, args.logins)
+        print(f"{method:<24} {hash_ms:>9.1f} {check_ms:>9.1f} {rate:>14.1f} {rejected:>9}")
+
+
+if __name__ == '__main__':
+    main()
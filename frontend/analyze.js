@@ -211,6 +211,12 @@ form.addEventListener('submit', async (e) => {
             aiExplanationCard.classList.remove('hidden');
             typeText(aiExplanationText, result.ai_explanation);
 
+        } else if (result.ai_status === 'pending' && result.analysis_id) {
+            // Explanation is generated in the background
+            aiExplanationCard.classList.remove('hidden');
+            aiExplanationText.textContent = 'Generating AI explanation...';
+            pollAiExplanation(result.analysis_id, aiExplanationCard, aiExplanationText);
+
         } else {
             aiExplanationCard.classList.add('hidden');
         }
@@ -256,6 +262,38 @@ form.addEventListener('submit', async (e) => {
         analyzeSpinner.style.display = 'none';
     }
 });
+/* =========================
+   BACKGROUND AI EXPLANATION
+   ========================= */
+
+async function pollAiExplanation(analysisId, card, textEl, attempt = 0) {
+    const MAX_ATTEMPTS = 30;
+
+    try {
+        const response = await fetch(`${API_BASE_URL}/analysis/${analysisId}/ai`, {
+            headers: getAuthHeaders(false)
+        });
+        const data = await response.json();
+
+        if (response.ok && data.ai_status !== 'pending') {
+            if (data.ai_explanation) {
+                typeText(textEl, data.ai_explanation);
+            } else {
+                card.classList.add('hidden');
+            }
+            return;
+        }
+    } catch (error) {
+        console.error('AI explanation poll failed:', error);
+    }
+
+    if (attempt + 1 >= MAX_ATTEMPTS) {
+        textEl.textContent = 'AI explanation unavailable. Please rely on rule-based analysis.';
+        return;
+    }
+    setTimeout(() => pollAiExplanation(analysisId, card, textEl, attempt + 1), 2000);
+}
+
 /* =========================
    NEW ANALYSIS / RESET
    ========================= */
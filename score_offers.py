@@ -0,0 +1,146 @@
+"""
+Offline Bulk Scoring
+Scores job offers from a JSONL or CSV file with the rule engine across a
+process pool and writes one JSON result per line. Needs no Flask, MongoDB
+or JWT setup.
+
+Usage:
+    python score_offers.py offers.jsonl -o scored.jsonl
+    python score_offers.py offers.csv -o scored.jsonl --workers 32
+
+Each input record needs a `text` field and may carry `company_email` and
+`company_website`. Every other field is copied to the output line.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+
+from backend.rules import get_rules
+from backend.scam_detector import analyze_job_offer
+
+OFFER_FIELDS = ('text', 'company_email', 'company_website')
+
+_find_similar = False
+
+
+# -----------------------------
+# WORKER
+# -----------------------------
+
+def _init_worker(find_similar):
+    global _find_similar
+    _find_similar = find_similar
+
+    # Rule pack log lines must not end up in JSONL written to stdout
+    sys.stdout = sys.stderr
+    # Compile the rule pack once per process, not once per offer
+    get_rules()
+
+
+def _score(task):
+    """Runs in a worker: parse one record, score it, return a JSON line"""
+    line_no, raw = task
+    try:
+        offer = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+        text = offer.get('text') or ''
+
+        out = {k: v for k, v in offer.items() if k not in OFFER_FIELDS}
+        out['line'] = line_no
+        out['result'] = analyze_job_offer(
+            text=text,
+            company_email=offer.get('company_email') or None,
+            company_website=offer.get('company_website') or None,
+            find_similar=_find_similar
+        )
+    except Exception as e:
+        out = {'line': line_no, 'error': str(e)}
+
+    return json.dumps(out, ensure_ascii=False) + '\n'
+
+
+# -----------------------------
+# INPUT
+# -----------------------------
+
+def _read_jsonl(f):
+    # Raw lines go to the workers so JSON parsing is parallel too
+    for line_no, line in enumerate(f, 1):
+        if line.strip():
+            yield line_no, line
+
+
+def _read_csv(f):
+    for line_no, row in enumerate(csv.DictReader(f), 2):
+        yield line_no, row
+
+
+def _bounded(tasks, slots):
+    """
+    Pool.imap drains its input eagerly; the semaphore keeps only a window
+    of tasks in flight so memory stays flat on multi-million-row files.
+    """
+    for task in tasks:
+        slots.acquire()
+        yield task
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score job offers from JSONL or CSV.')
+    parser.add_argument('input', help='Input file (.jsonl or .csv), or - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='Output JSONL file (default: stdout)')
+    parser.add_argument('--format', choices=('jsonl', 'csv'),
+                        help='Input format (default: from file extension)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=256,
+                        help='Records sent to a worker at a time')
+    parser.add_argument('--similar', action='store_true',
+                        help='Also look up near-duplicates in the similarity index')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    reader = _read_csv if fmt == 'csv' else _read_jsonl
+
+    infile = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8', newline='')
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+
+    # Compiled before the pool forks, so workers inherit it
+    with redirect_stdout(sys.stderr):
+        rules = get_rules()
+    print(f"Scoring with rule pack {rules.version} on {args.workers} workers", file=sys.stderr)
+
+    slots = threading.Semaphore(args.workers * args.chunksize * 4)
+    started = time.monotonic()
+    count = 0
+
+    try:
+        with Pool(args.workers, initializer=_init_worker, initargs=(args.similar,)) as pool:
+            tasks = _bounded(reader(infile), slots)
+            for line in pool.imap(_score, tasks, chunksize=args.chunksize):
+                outfile.write(line)
+                slots.release()
+                count += 1
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    elapsed = time.monotonic() - started
+    rate = count / elapsed if elapsed else 0
+    print(f"Scored {count} offers in {elapsed:.1f}s ({rate:.0f}/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()